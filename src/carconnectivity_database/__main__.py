@@ -0,0 +1,5 @@
+"""Allows running the commandline interface with ``python -m carconnectivity_database``."""
+from carconnectivity_database.carconnectivity_database_base import main
+
+if __name__ == '__main__':
+    main()
@@ -2,16 +2,28 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 
-import logging
+import functools
+import sys
 
-from carconnectivity.carconnectivity_base import CLI
+if TYPE_CHECKING:
+    from carconnectivity.carconnectivity_base import CLI
 
-from carconnectivity_plugins.database._version import __version__
 
-if TYPE_CHECKING:
-    pass
+@functools.cache
+def _get_cli() -> CLI:
+    """
+    Create the command-line interface on first use and return the same instance on every subsequent call.
 
-LOG = logging.getLogger("carconnectivity-database")
+    Returns:
+        CLI: The command-line interface of the car connectivity database application.
+    """
+    import logging  # pylint: disable=import-outside-toplevel
+    from carconnectivity.carconnectivity_base import CLI  # pylint: disable=import-outside-toplevel
+    from carconnectivity_plugins.database._version import __version__  # pylint: disable=import-outside-toplevel
+
+    log: logging.Logger = logging.getLogger("carconnectivity-database")
+    return CLI(logger=log, name='carconnectivity-database', description='Commandline Interface to interact with Car Services of various brands',
+               subversion=__version__)
 
 
 def main() -> None:
@@ -20,7 +32,14 @@ def main() -> None:
 
     This function initializes and starts the command-line interface (CLI) for the
     car connectivity application using the specified logger and application name.
+    All imports are done here and not at module level so that importing this module
+    does not pull in the complete carconnectivity stack.
+    A plain version request is answered before anything else is imported.
     """
-    cli: CLI = CLI(logger=LOG, name='carconnectivity-database', description='Commandline Interface to interact with Car Services of various brands',
-                   subversion=__version__)
-    cli.main()
+    argv: list[str] = sys.argv[1:]
+    if len(argv) == 1 and argv[0] in ('-V', '--version'):
+        from carconnectivity_plugins.database._version import __version__  # pylint: disable=import-outside-toplevel
+        print(f'carconnectivity-database {__version__}')
+        return
+
+    _get_cli().main()
@@ -0,0 +1 @@
+""" This module contains the agents that record vehicle data to the database."""
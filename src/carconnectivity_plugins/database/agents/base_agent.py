@@ -9,10 +9,39 @@ Classes:
     BaseAgent: Abstract base class for database agents.
 
 """
+from __future__ import annotations
+from typing import TYPE_CHECKING
 
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import logging
 
-# pylint: disable-next=too-few-public-methods
-class BaseAgent():
+from sqlalchemy import inspect, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DatabaseError, IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterator, Optional, TypeVar
+    from datetime import datetime
+    import threading
+    from sqlalchemy.orm.session import Session
+
+    from carconnectivity_plugins.database.model.base import Base
+    from carconnectivity_plugins.database.model.vehicle import Vehicle
+    from carconnectivity_plugins.database.plugin import Plugin
+
+    _RowT = TypeVar('_RowT', bound=Base)
+
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.base_agent")
+
+# Dialects supporting INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+class BaseAgent(ABC):
     """
     Base class for database agents in the CarConnectivity plugin system.
     This class serves as an abstract base for implementing specific database agents
@@ -20,3 +49,163 @@ class BaseAgent():
     Agents extending this class should implement the necessary methods for interacting
     with their respective database backends.
     """
+    __slots__ = ()
+
+    # Set by the constructors of the agents, the helpers of this class rely on them
+    database_plugin: Plugin
+    # The vehicle named in log messages, agents recording something else override _describe()
+    vehicle: Vehicle
+    # The long-lived session of the agents using _session_scope(), only to be used while holding session_lock
+    session: Session
+    session_lock: threading.RLock
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Stop the agent by removing all observers it registered on the CarConnectivity objects.
+        Called by the plugin on shutdown, it may be called again when the agent is garbage collected.
+        """
+
+    def flush(self) -> None:
+        """
+        Write changes the agent has held back to the database.
+        Agents that write every change immediately do not need to override this.
+        """
+
+    def _describe(self) -> str:
+        """
+        Name what the agent records in log messages of the base class.
+
+        Returns:
+            str: The description, by default the vehicle of the agent.
+        """
+        return f'vehicle {self.vehicle.vin}'
+
+    @contextmanager
+    def _session_scope(self, startup: bool = False) -> Iterator[Session]:
+        """
+        Provide the long-lived session of the agent for one unit of work.
+        Agents using it keep their session in a session attribute guarded by session_lock and have a database_plugin attribute.
+        The transaction is ended when leaving the scope, so no read transaction and pooled connection is kept open between events.
+        As the session has expire_on_commit disabled, the cached rows stay loaded in its identity map.
+        On SQLite the write lock of the plugin is held as well, so agents do not write at the same time.
+
+        Args:
+            startup (bool): The agent is loading its state in its constructor. Database errors are re-raised after the rollback,
+                so connecting the vehicle fails and is retried instead of starting an agent without its state.
+
+        Yields:
+            Session: The session of the agent.
+        """
+        with self.session_lock, self.database_plugin.write_lock:
+            try:
+                yield self.session
+                if self.session.in_transaction():
+                    self.session.commit()
+            except StaleDataError as err:
+                self.session.rollback()
+                if startup:
+                    raise
+                LOG.warning('Row of %s was deleted from database meanwhile, will reload it with the next update: %s', self._describe(), err)
+            except DatabaseError as err:
+                self.session.rollback()
+                if startup:
+                    raise
+                LOG.error('DatabaseError while accessing database for %s: %s', self._describe(), err)
+                self.database_plugin.report_database_error()
+            except Exception:
+                self.session.rollback()
+                raise
+
+    @contextmanager
+    def _commit_scope(self, session: Session, action: str) -> Iterator[None]:
+        """
+        Commit the changes made in the block. On a database error they are rolled back, the error is logged and reported to the plugin,
+        and the caller continues after the block. An integrity conflict, e.g. a row another process added meanwhile, is rolled back
+        and logged, but does not mark the database unhealthy.
+        Only the given session is used, so agents without a long-lived session can use it as well. It relies on the database_plugin
+        attribute declared by BaseAgent.
+
+        Args:
+            session (Session): The session the changes are made in, e.g. the one yielded by _session_scope().
+            action (str): What the block does for the log message, e.g. 'ending charging session'.
+        """
+        try:
+            yield
+            session.commit()
+        except IntegrityError as err:
+            session.rollback()
+            LOG.error('IntegrityError while %s for %s in database: %s', action, self._describe(), err)
+        except DatabaseError as err:
+            session.rollback()
+            LOG.error('DatabaseError while %s for %s in database: %s', action, self._describe(), err)
+            self.database_plugin.report_database_error()
+
+    @staticmethod
+    def _get_current(session: Session, row: _RowT) -> Optional[_RowT]:
+        """
+        Get the current state of a cached row by its identity.
+        Rows that are still loaded in the identity map of the session are returned without a query, all others are loaded with a
+        single SELECT by primary key.
+
+        Args:
+            session (Session): The session to load the row into.
+            row (_RowT): The cached row.
+
+        Returns:
+            Optional[_RowT]: The row in the given session or None if it was deleted from the database in the meantime.
+        """
+        return session.get(type(row), inspect(row).identity)
+
+    @staticmethod
+    def _update_last_date(session: Session, row: Base, last_date: datetime) -> None:
+        """
+        Extend the last date of a time series row with a Core UPDATE by its primary key instead of changing the attribute and flushing it.
+        The new value is set on the row without marking it as modified, so the next commit does not write it again.
+
+        Args:
+            session (Session): The session to execute the UPDATE in. The caller commits the transaction.
+            row (Base): The row to extend, it needs an id primary key and a last_date column.
+            last_date (datetime): The new last date of the row.
+        """
+        BaseAgent._update_columns(session, row, {'last_date': last_date})
+
+    @staticmethod
+    def _update_columns(session: Session, row: Base, values: Dict[str, Any]) -> None:
+        """
+        Write columns of a row with a Core UPDATE by its primary key instead of changing the attributes and flushing them.
+        The new values are set on the row without marking it as modified, so the next commit does not write them again.
+
+        Args:
+            session (Session): The session to execute the UPDATE in. The caller commits the transaction.
+            row (Base): The row to update, it needs an id primary key.
+            values (Dict[str, Any]): The new values by column name.
+        """
+        table = row.__table__
+        session.execute(update(table).where(table.c.id == row.id).values(values))
+        for key, value in values.items():
+            set_committed_value(row, key, value)
+
+    @staticmethod
+    def _upsert_by_uid(session: Session, row: Base) -> str:
+        """
+        Insert a row identified by its uid primary key, e.g. a location, or update the existing row with a single statement.
+        Unlike merging the row into the session, this needs no SELECT by primary key and does not load the row into the session.
+        On databases without INSERT ... ON CONFLICT the row is merged instead.
+
+        Args:
+            session (Session): The session to execute the statement in. The caller commits the transaction.
+            row (Base): The transient row with all columns set.
+
+        Returns:
+            str: The uid of the row, to be set as foreign key.
+        """
+        upsert_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+        if upsert_insert is None:
+            return session.merge(row).uid
+        table = row.__table__
+        values: Dict[str, Any] = {column.key: getattr(row, column.key) for column in table.columns}
+        statement = upsert_insert(table).values(values)
+        session.execute(statement.on_conflict_do_update(index_elements=[table.c.uid],
+                                                        set_={key: statement.excluded[key] for key in values if key != 'uid'}))
+        return row.uid
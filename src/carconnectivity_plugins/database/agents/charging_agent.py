@@ -3,13 +3,17 @@ Handles charging-related data for electric vehicles, tracking charging sessions,
 charging states, rates, and power, and recording them in the database.
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 import logging
+import queue
+import threading
+from functools import partial
 from datetime import timedelta, datetime, timezone
 
+from sqlalchemy import Float, Integer, bindparam, cast, insert, inspect, literal, null, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.orm.exc import ObjectDeletedError
 
 from carconnectivity.observable import Observable
 from carconnectivity.vehicle import ElectricVehicle
@@ -28,18 +32,120 @@ from carconnectivity_plugins.database.model.charging_station import ChargingStat
 from carconnectivity_plugins.database.model.battery_temperature import BatteryTemperature
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Any, Callable, Dict, Optional, Type
+    from sqlalchemy import CompoundSelect, Insert, Select, Table, Update
     from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm.session import Session
 
-    from carconnectivity.attributes import EnumAttribute, SpeedAttribute, PowerAttribute, FloatAttribute, TemperatureAttribute
+    from carconnectivity.attributes import GenericAttribute, EnumAttribute, SpeedAttribute, PowerAttribute, FloatAttribute, TemperatureAttribute
 
     from carconnectivity_plugins.database.plugin import Plugin
+    from carconnectivity_plugins.database.model.base import Base
     from carconnectivity_plugins.database.model.vehicle import Vehicle
     from carconnectivity.drive import ElectricDrive
 
+    # Handlers by the previous and the current state of a transition
+    _Transitions = Dict[tuple[bool, bool], Callable[[Session, '_Sample'], None]]
+
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.charging_agent")
 
+# Statements are built once and executed with parameters, so they are not rebuilt on every event and hit SQLAlchemy's compiled cache
+_VALUE_COLUMNS: Dict[Type[Base], str] = {ChargingState: 'state', ChargingRate: 'rate', ChargingPower: 'power', BatteryTemperature: 'battery_temperature'}
+_TIME_SERIES_MODELS: tuple[Type[Base], ...] = tuple(_VALUE_COLUMNS)
+
+
+def _last_row_select(model_index: int, model: Type[Base]) -> Select:
+    """
+    Build the SELECT of the most recent row of a time series table for the vehicle, tagged with the index of its model in _TIME_SERIES_MODELS.
+    Charging states are returned in the state column and all other values in the number column. This way the SELECTs of all tables
+    have the same column types and can be combined with UNION ALL.
+
+    Args:
+        model_index (int): Index of the model in _TIME_SERIES_MODELS.
+        model (Type[Base]): The time series model.
+
+    Returns:
+        Select: The SELECT returning at most one row.
+    """
+    table = model.__table__
+    last_row = select(table.c.id, table.c[_VALUE_COLUMNS[model]].label('value'), table.c.first_date, table.c.last_date) \
+        .where(table.c.vin == bindparam('vin')).order_by(table.c.first_date.desc()).limit(1).subquery()
+    if model is ChargingState:
+        number, state = cast(null(), Float), last_row.c.value
+    else:
+        number, state = last_row.c.value, cast(null(), ChargingState.__table__.c.state.type)
+    return select(literal(model_index, Integer).label('model_index'), last_row.c.id, number.label('number'), state.label('state'),
+                  last_row.c.first_date, last_row.c.last_date)
+
+
+def _build_insert_statements(upsert_insert: Optional[Callable[[Table], Any]]) -> Dict[Type[Base], Insert]:
+    """
+    Build the INSERT statements of the time series tables.
+
+    Args:
+        upsert_insert (Optional[Callable[[Table], Any]]): The insert() of the dialect if it supports INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+            None to build plain INSERT statements.
+
+    Returns:
+        Dict[Type[Base], Insert]: The INSERT statements by time series model.
+    """
+    insert_statements: Dict[Type[Base], Insert] = {}
+    for model in _TIME_SERIES_MODELS:
+        table = model.__table__
+        if upsert_insert is not None:
+            upsert_statement = upsert_insert(table)
+            # Setting first_date to its own value keeps the existing row, but unlike DO NOTHING it is returned by RETURNING
+            insert_statements[model] = upsert_statement.on_conflict_do_update(
+                index_elements=[table.c.vin, table.c.first_date], set_={'first_date': upsert_statement.excluded.first_date}) \
+                .returning(*table.columns)
+        else:
+            insert_statements[model] = insert(table)
+    return insert_statements
+
+
+# The most recent rows of all time series tables are loaded in a single round trip on startup
+_LAST_ROWS_STATEMENT: CompoundSelect = union_all(*(_last_row_select(model_index, model) for model_index, model in enumerate(_TIME_SERIES_MODELS)))
+_LAST_CHARGING_SESSION_STATEMENT: Select = select(ChargingSession).where(ChargingSession.vin == bindparam('vin')) \
+    .order_by(ChargingSession.session_start_date.desc().nulls_first(),
+              ChargingSession.plug_locked_date.desc().nulls_first(),
+              ChargingSession.plug_connected_date.desc().nulls_first()).limit(1)
+_LAST_DATE_UPDATE_STATEMENTS: Dict[Type[Base], Update] = {model: update(model.__table__).where(model.__table__.c.id == bindparam('row_id'))
+                                                          .values(last_date=bindparam('new_last_date')) for model in _TIME_SERIES_MODELS}
+
+# Charging states in which the vehicle is in a charging session
+_CHARGING_STATES: frozenset[Charging.ChargingState] = frozenset({Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION})
+_EVENT_BACKLOG_WARNING: int = 1024
+_MIN_DATE: datetime = datetime.min.replace(tzinfo=timezone.utc)
+# How long a charging session may be interrupted and still be continued, longer interruptions are allowed while in conservation
+_ALLOWED_INTERRUPT: timedelta = timedelta(hours=24)
+_ALLOWED_CONSERVATION_INTERRUPT: timedelta = timedelta(hours=300)
+# How long after the end of a charging session a late battery level update is still accepted as end level
+_LATE_END_LEVEL: timedelta = timedelta(minutes=1)
+
+
+class _RowSnapshot:  # pylint: disable=too-few-public-methods
+    """
+    Plain copy of the most recent row of a charging time series table.
+    Unlike an ORM instance it is not bound to a session, so it never expires and comparing its values needs no attribute instrumentation.
+    """
+    __slots__ = ('model', 'id', 'value', 'first_date', 'last_date')
+
+    def __init__(self, model: Type[Base], row_id: int, value: Any, first_date: datetime, last_date: datetime) -> None:
+        self.model: Type[Base] = model
+        self.id: int = row_id  # pylint: disable=invalid-name
+        self.value: Any = value
+        self.first_date: datetime = first_date
+        self.last_date: datetime = last_date
+
+
+class _Sample(NamedTuple):
+    """
+    Values of an observed attribute at the time of the event. The attribute may already have changed again when the worker handles the event.
+    """
+    value: Any
+    last_updated: Optional[datetime]
+    last_changed: Optional[datetime]
+
 
 # pylint: disable=duplicate-code
 # pylint: disable-next=too-many-instance-attributes, too-few-public-methods
@@ -69,21 +175,31 @@ class ChargingAgent(BaseAgent):
     Attributes:
         database_plugin (Plugin): Reference to the database plugin for health status updates.
         session_factory (scoped_session[Session]): SQLAlchemy session factory for database operations.
+        session (Session): Long-lived session of the agent, only to be used through _session_scope().
+        session_lock (threading.RLock): Lock for thread-safe use of the session.
+        event_queue (queue.SimpleQueue): Events of the observed attributes waiting to be handled by the worker thread, None stops the worker.
+        worker_thread (threading.Thread): Thread handling the events one after another, so the observers never wait for the database.
+        insert_statements (Dict[Type[Base], Insert]): INSERT statements for the charging time series tables, as upsert if supported.
+        upsert_supported (bool): True if the INSERT statements are upserts returning the resulting row.
         vehicle (Vehicle): Database model of the vehicle being monitored.
         carconnectivity_vehicle (ElectricVehicle): CarConnectivity vehicle object with live data.
+        electric_drive (Optional[ElectricDrive]): Electric drive of the vehicle providing battery level and temperature.
         last_charging_session (Optional[ChargingSession]): Most recent charging session from database.
-        last_charging_session_lock (TimeoutLock): Lock for thread-safe charging session updates.
         carconnectivity_last_charging_state (Optional[Charging.ChargingState]): Last observed charging state.
         carconnectivity_last_connector_state (Optional[ChargingConnector.ChargingConnectorConnectionState]):
             Last observed connector connection state.
         carconnectivity_last_connector_lock_state (Optional[ChargingConnector.ChargingConnectorLockState]):
             Last observed connector lock state.
-        last_charging_state (Optional[ChargingState]): Most recent charging state record from database.
-        last_charging_state_lock (TimeoutLock): Lock for thread-safe charging state updates.
-        last_charging_rate (Optional[ChargingRate]): Most recent charging rate record from database.
-        last_charging_rate_lock (TimeoutLock): Lock for thread-safe charging rate updates.
-        last_charging_power (Optional[ChargingPower]): Most recent charging power record from database.
-        last_charging_power_lock (TimeoutLock): Lock for thread-safe charging power updates.
+        last_charging_state (Optional[_RowSnapshot]): Snapshot of the most recent charging state record from database.
+        last_charging_rate (Optional[_RowSnapshot]): Snapshot of the most recent charging rate record from database.
+        last_charging_power (Optional[_RowSnapshot]): Snapshot of the most recent charging power record from database.
+        last_battery_temperature (Optional[_RowSnapshot]): Snapshot of the most recent battery temperature record from database.
+        pending_last_dates (Dict[Type[Base], Dict[int, datetime]]): Extended last dates of charging states, charging rates, charging powers
+            and battery temperatures that are not yet written to the database, by model and row id.
+        pending_last_dates_lock (TimeoutLock): Lock for thread-safe access to pending_last_dates.
+        charging_state_transitions (Dict[tuple[bool, bool], Callable[[Session, _Sample], None]]): Handlers for starting and stopping charging.
+        locale_conversions (Dict[int, tuple[tuple[Any, Any], Optional[float]]]): Last value and unit of each converted attribute
+            with its value in the unit of the locale, by id of the attribute.
     Raises:
         ValueError: If vehicle or carconnectivity_vehicle is None, or if carconnectivity_vehicle
             is not an ElectricVehicle instance.
@@ -99,23 +215,40 @@ class ChargingAgent(BaseAgent):
         self.session_factory: scoped_session[Session] = session_factory
         self.vehicle: Vehicle = vehicle
         self.carconnectivity_vehicle: ElectricVehicle = carconnectivity_vehicle
-
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            self.last_charging_session: Optional[ChargingSession] = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                          ChargingSession.plug_locked_date.desc().nulls_first(),
-                          ChargingSession.plug_connected_date.desc().nulls_first()).first()
-
-            self.last_charging_session_lock: TimeoutLock = TimeoutLock()
-            self.carconnectivity_last_charging_state: Optional[Charging.ChargingState] = self.carconnectivity_vehicle.charging.state.value
-            self.carconnectivity_last_connector_state: Optional[ChargingConnector.ChargingConnectorConnectionState] = self.carconnectivity_vehicle.charging\
-                .connector.connection_state.value
-            self.carconnectivity_last_connector_lock_state: Optional[ChargingConnector.ChargingConnectorLockState] = self.carconnectivity_vehicle.charging\
-                .connector.lock_state.value
+        # The drives of a vehicle do not change, the observers are registered once on this drive
+        self.electric_drive: Optional[ElectricDrive] = self.carconnectivity_vehicle.get_electric_drive()
+
+        self.pending_last_dates: Dict[Type[Base], Dict[int, datetime]] = {}
+        self.pending_last_dates_lock: TimeoutLock = TimeoutLock()
+
+        # The session lives as long as the agent. It is used by the worker thread and by flush() and close() called from the plugin
+        # Changes are only flushed by the explicit commits of the handlers, no handler queries after changing a row before committing
+        self.session: Session = self.session_factory.session_factory(autoflush=False)
+        self.session_lock: threading.RLock = threading.RLock()
+        # INSERT ... ON CONFLICT DO UPDATE ... RETURNING is available on PostgreSQL and SQLite 3.35+, other databases use a plain INSERT
+        dialect = self.session.get_bind().dialect
+        upsert_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(dialect.name) if dialect.insert_returning else None
+        self.upsert_supported: bool = upsert_insert is not None
+        self.insert_statements: Dict[Type[Base], Insert] = _build_insert_statements(upsert_insert)
+
+        self.locale_conversions: Dict[int, tuple[tuple[Any, Any], Optional[float]]] = {}
+        self.charging_state_transitions, self.connector_state_transitions, self.connector_lock_state_transitions = self._build_transition_tables()
+
+        self.carconnectivity_last_charging_state: Optional[Charging.ChargingState] = self.carconnectivity_vehicle.charging.state.value
+        self.carconnectivity_last_connector_state: Optional[ChargingConnector.ChargingConnectorConnectionState] = self.carconnectivity_vehicle.charging\
+            .connector.connection_state.value
+        self.carconnectivity_last_connector_lock_state: Optional[ChargingConnector.ChargingConnectorLockState] = self.carconnectivity_vehicle.charging\
+            .connector.lock_state.value
+        self.last_charging_session: Optional[ChargingSession] = None
+        self.last_charging_state: Optional[_RowSnapshot] = None
+        self.last_charging_rate: Optional[_RowSnapshot] = None
+        self.last_charging_power: Optional[_RowSnapshot] = None
+        self.last_battery_temperature: Optional[_RowSnapshot] = None
+
+        with self._session_scope(startup=True) as session:
+            self.last_charging_session = self._load_last_charging_session(session)
             if self.last_charging_session is not None and not self.last_charging_session.is_closed():
-                if self.carconnectivity_vehicle.charging.state.value in (Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION) \
+                if self.carconnectivity_vehicle.charging.state.value in _CHARGING_STATES \
                     or (self.carconnectivity_vehicle.charging.connector.connection_state.enabled
                         and self.carconnectivity_vehicle.charging.connector.connection_state.value ==
                         ChargingConnector.ChargingConnectorConnectionState.CONNECTED) \
@@ -126,723 +259,672 @@ class ChargingAgent(BaseAgent):
                     LOG.info("Last charging session for vehicle %s is still open during startup, but we are not charging, ignoring it", self.vehicle.vin)
                     self.last_charging_session = None
 
-            self.last_charging_state: Optional[ChargingState] = session.query(ChargingState).filter(ChargingState.vehicle == self.vehicle)\
-                .order_by(ChargingState.first_date.desc()).first()
-            self.last_charging_state_lock: TimeoutLock = TimeoutLock()
-
-            self.last_charging_rate: Optional[ChargingRate] = session.query(ChargingRate).filter(ChargingRate.vehicle == self.vehicle)\
-                .order_by(ChargingRate.first_date.desc()).first()
-            self.last_charging_rate_lock: TimeoutLock = TimeoutLock()
-
-            self.last_charging_power: Optional[ChargingPower] = session.query(ChargingPower).filter(ChargingPower.vehicle == self.vehicle)\
-                .order_by(ChargingPower.first_date.desc()).first()
-            self.last_charging_power_lock: TimeoutLock = TimeoutLock()
-
-            self.last_battery_temperature: Optional[BatteryTemperature] = session.query(BatteryTemperature).filter(BatteryTemperature.vehicle == self.vehicle) \
-                .order_by(BatteryTemperature.first_date.desc()).first()
-            self.last_battery_temperature_lock: TimeoutLock = TimeoutLock()
-
-            self.carconnectivity_vehicle.charging.connector.connection_state.add_observer(self.__on_connector_state_change, Observable.ObserverEvent.UPDATED)
-            if self.carconnectivity_vehicle.charging.connector.connection_state.enabled:
-                self.__on_connector_state_change(self.carconnectivity_vehicle.charging.connector.connection_state, Observable.ObserverEvent.UPDATED)
-
-            self.carconnectivity_vehicle.charging.connector.lock_state.add_observer(self.__on_connector_lock_state_change, Observable.ObserverEvent.UPDATED)
-            if self.carconnectivity_vehicle.charging.connector.lock_state.enabled:
-                self.__on_connector_lock_state_change(self.carconnectivity_vehicle.charging.connector.lock_state, Observable.ObserverEvent.UPDATED)
-
-            self.carconnectivity_vehicle.charging.state.add_observer(self.__on_charging_state_change, Observable.ObserverEvent.UPDATED)
-            if self.carconnectivity_vehicle.charging.state.enabled:
-                self.__on_charging_state_change(self.carconnectivity_vehicle.charging.state, Observable.ObserverEvent.UPDATED)
-
-            self.carconnectivity_vehicle.charging.rate.add_observer(self.__on_charging_rate_change, Observable.ObserverEvent.UPDATED)
-            if self.carconnectivity_vehicle.charging.rate.enabled:
-                self.__on_charging_rate_change(self.carconnectivity_vehicle.charging.rate, Observable.ObserverEvent.UPDATED)
-
-            self.carconnectivity_vehicle.charging.power.add_observer(self.__on_charging_power_change, Observable.ObserverEvent.UPDATED)
-            if self.carconnectivity_vehicle.charging.power.enabled:
-                self.__on_charging_power_change(self.carconnectivity_vehicle.charging.power, Observable.ObserverEvent.UPDATED)
-
-            self.carconnectivity_vehicle.charging.type.add_observer(self._on_charging_type_change, Observable.ObserverEvent.VALUE_CHANGED)
-
-            electric_drive: Optional[ElectricDrive] = self.carconnectivity_vehicle.get_electric_drive()
-            if electric_drive is not None:
-                electric_drive.level.add_observer(self._on_battery_level_change, Observable.ObserverEvent.VALUE_CHANGED)
-
-                electric_drive.battery.temperature.add_observer(self.__on_battery_temperature_change, Observable.ObserverEvent.VALUE_CHANGED)
-                if electric_drive.battery.temperature.enabled:
-                    self.__on_battery_temperature_change(electric_drive.battery.temperature, Observable.ObserverEvent.UPDATED)
-        self.session_factory.remove()
+            last_rows: Dict[Type[Base], _RowSnapshot] = self._load_last_rows(session)
+            self.last_charging_state = last_rows.get(ChargingState)
+            self.last_charging_rate = last_rows.get(ChargingRate)
+            self.last_charging_power = last_rows.get(ChargingPower)
+            self.last_battery_temperature = last_rows.get(BatteryTemperature)
+
+        # The observers only queue the events, the database work is done by the worker thread
+        self.event_queue: queue.SimpleQueue[Optional[tuple[Callable[[_Sample], None], _Sample]]] = queue.SimpleQueue()
+        self.last_queued_samples: Dict[Callable[[_Sample], None], _Sample] = {}
+        self.worker_thread: threading.Thread = threading.Thread(target=self._process_events, daemon=True)
+        self.worker_thread.name = f'carconnectivity.plugins.database-charging-{self.vehicle.vin}'
+        self.worker_thread.start()
+
+        self.carconnectivity_vehicle.charging.connector.connection_state.add_observer(self.__on_connector_state_change, Observable.ObserverEvent.UPDATED)
+        if self.carconnectivity_vehicle.charging.connector.connection_state.enabled:
+            self.__on_connector_state_change(self.carconnectivity_vehicle.charging.connector.connection_state, Observable.ObserverEvent.UPDATED)
+
+        self.carconnectivity_vehicle.charging.connector.lock_state.add_observer(self.__on_connector_lock_state_change, Observable.ObserverEvent.UPDATED)
+        if self.carconnectivity_vehicle.charging.connector.lock_state.enabled:
+            self.__on_connector_lock_state_change(self.carconnectivity_vehicle.charging.connector.lock_state, Observable.ObserverEvent.UPDATED)
+
+        self.carconnectivity_vehicle.charging.state.add_observer(self.__on_charging_state_change, Observable.ObserverEvent.UPDATED)
+        if self.carconnectivity_vehicle.charging.state.enabled:
+            self.__on_charging_state_change(self.carconnectivity_vehicle.charging.state, Observable.ObserverEvent.UPDATED)
+
+        self.carconnectivity_vehicle.charging.rate.add_observer(self.__on_charging_rate_change, Observable.ObserverEvent.UPDATED)
+        if self.carconnectivity_vehicle.charging.rate.enabled:
+            self.__on_charging_rate_change(self.carconnectivity_vehicle.charging.rate, Observable.ObserverEvent.UPDATED)
+
+        self.carconnectivity_vehicle.charging.power.add_observer(self.__on_charging_power_change, Observable.ObserverEvent.UPDATED)
+        if self.carconnectivity_vehicle.charging.power.enabled:
+            self.__on_charging_power_change(self.carconnectivity_vehicle.charging.power, Observable.ObserverEvent.UPDATED)
+
+        self.carconnectivity_vehicle.charging.type.add_observer(self._on_charging_type_change, Observable.ObserverEvent.VALUE_CHANGED)
+
+        if self.electric_drive is not None:
+            self.electric_drive.level.add_observer(self._on_battery_level_change, Observable.ObserverEvent.VALUE_CHANGED)
+
+            self.electric_drive.battery.temperature.add_observer(self.__on_battery_temperature_change, Observable.ObserverEvent.VALUE_CHANGED)
+            if self.electric_drive.battery.temperature.enabled:
+                self.__on_battery_temperature_change(self.electric_drive.battery.temperature, Observable.ObserverEvent.UPDATED)
+
+    def _build_transition_tables(self) -> tuple[_Transitions, _Transitions, _Transitions]:
+        """
+        Build the tables of the handlers for the transitions of the charging state, the connector state and the connector lock state.
+
+        Returns:
+            tuple[_Transitions, _Transitions, _Transitions]: The handlers by (was charging, is charging), by (was connected, is connected)
+                and by (was locked, is locked).
+        """
+        # Nothing needs to be done if the vehicle keeps charging or not charging
+        charging_state_transitions: _Transitions = {(False, True): self._start_charging, (True, False): self._stop_charging}
+        # Staying connected or locked is the state found on startup
+        connector_state_transitions: _Transitions = {(False, True): self._connect_plug, (True, False): self._disconnect_plug,
+                                                     (True, True): partial(self._connect_plug, on_startup=True)}
+        connector_lock_state_transitions: _Transitions = {(False, True): self._lock_plug, (True, False): self._unlock_plug,
+                                                          (True, True): partial(self._lock_plug, on_startup=True)}
+        return charging_state_transitions, connector_state_transitions, connector_lock_state_transitions
 
     def __del__(self) -> None:
+        # An agent whose constructor failed before it created its session has not registered anything to clean up
+        if hasattr(self, 'session'):
+            self.close()
+
+    def close(self) -> None:
         self.carconnectivity_vehicle.charging.connector.connection_state.remove_observer(self.__on_connector_state_change)
         self.carconnectivity_vehicle.charging.connector.lock_state.remove_observer(self.__on_connector_lock_state_change)
         self.carconnectivity_vehicle.charging.state.remove_observer(self.__on_charging_state_change)
         self.carconnectivity_vehicle.charging.rate.remove_observer(self.__on_charging_rate_change)
         self.carconnectivity_vehicle.charging.power.remove_observer(self.__on_charging_power_change)
         self.carconnectivity_vehicle.charging.type.remove_observer(self._on_charging_type_change)
-        electric_drive: Optional[ElectricDrive] = self.carconnectivity_vehicle.get_electric_drive()
-        if electric_drive is not None:
-            electric_drive.level.remove_observer(self._on_battery_level_change)
-            electric_drive.battery.temperature.remove_observer(self.__on_battery_temperature_change)
+        if self.electric_drive is not None:
+            self.electric_drive.level.remove_observer(self._on_battery_level_change)
+            self.electric_drive.battery.temperature.remove_observer(self.__on_battery_temperature_change)
+        # Let the worker handle the events queued so far before the session is closed
+        # The worker is not started yet if loading the state failed in the constructor
+        worker_thread: Optional[threading.Thread] = getattr(self, 'worker_thread', None)
+        if worker_thread is not None and worker_thread.is_alive():
+            self.event_queue.put(None)
+            if worker_thread is not threading.current_thread():
+                worker_thread.join()
+        self.flush()
+        with self.session_lock:
+            self.session.close()
+
+    def _process_events(self) -> None:
+        """
+        Handle the queued events one after another until None is queued by close().
+        As this is the only thread handling events, the cached rows and states of the agent are not accessed concurrently.
+        """
+        while True:
+            event: Optional[tuple[Callable[[_Sample], None], _Sample]] = self.event_queue.get()
+            if event is None:
+                break
+            handler, sample = event
+            try:
+                handler(sample)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                LOG.exception('Error while handling charging event for vehicle %s: %s', self.vehicle.vin, err)
+
+    def _queue_event(self, handler: Callable[[_Sample], None], sample: _Sample) -> None:
+        """
+        Queue an event for the worker thread.
+        A repeated notification with the same value and no newer update date than the last queued one is dropped, as handling it
+        would not change anything in the database.
+
+        Args:
+            handler (Callable[[_Sample], None]): The handler for the event.
+            sample (_Sample): The snapshot of the attribute.
+        """
+        last_sample: Optional[_Sample] = self.last_queued_samples.get(handler)
+        if last_sample is not None and last_sample.value == sample.value \
+                and (sample.last_updated is None or (last_sample.last_updated is not None and sample.last_updated <= last_sample.last_updated)):
+            return
+        self.last_queued_samples[handler] = sample
+        self.event_queue.put((handler, sample))
+        # Events are never dropped, but a growing backlog shows that the database cannot keep up
+        if self.event_queue.qsize() == _EVENT_BACKLOG_WARNING:
+            LOG.warning('%d charging events of vehicle %s are waiting to be written to the database', _EVENT_BACKLOG_WARNING, self.vehicle.vin)
+
+    def flush(self) -> None:
+        with self.pending_last_dates_lock:
+            if not self.pending_last_dates:
+                return
+        with self._session_scope() as session:
+            self._write_pending_last_dates(session)
+
+    def _in_locale(self, element: GenericAttribute) -> Optional[float]:
+        """
+        Convert the value of an attribute to the unit of the configured locale.
+        The conversion only depends on value and unit, so it is reused for repeated samples with the same value and unit.
+
+        Args:
+            element (GenericAttribute): The attribute to convert the value of.
+
+        Returns:
+            Optional[float]: The value in the unit of the locale.
+        """
+        key: tuple[Any, Any] = (element.value, element.unit)
+        cached: Optional[tuple[tuple[Any, Any], Optional[float]]] = self.locale_conversions.get(id(element))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
+        self.locale_conversions[id(element)] = (key, converted_value)
+        return converted_value
+
+    def _load_last_rows(self, session: Session) -> Dict[Type[Base], _RowSnapshot]:
+        """
+        Load the most recent row of each time series model for the vehicle with a single statement.
+        The lookups filter on the vin foreign key column, so they are served by the unique (vin, first_date) index of each table.
+
+        Args:
+            session (Session): The session to use.
+
+        Returns:
+            Dict[Type[Base], _RowSnapshot]: The most recent row by model, models without a row for the vehicle are missing.
+        """
+        last_rows: Dict[Type[Base], _RowSnapshot] = {}
+        for row in session.execute(_LAST_ROWS_STATEMENT, {'vin': self.vehicle.vin}):
+            model: Type[Base] = _TIME_SERIES_MODELS[row.model_index]
+            last_rows[model] = _RowSnapshot(model, row.id, row.state if model is ChargingState else row.number, row.first_date, row.last_date)
+        return last_rows
+
+    def _load_last_charging_session(self, session: Session) -> Optional[ChargingSession]:
+        """
+        Load the most recent charging session of the vehicle.
+
+        Args:
+            session (Session): The session to load the charging session into.
+
+        Returns:
+            Optional[ChargingSession]: The most recent charging session or None if there is no charging session for the vehicle.
+        """
+        return session.scalars(_LAST_CHARGING_SESSION_STATEMENT, {'vin': self.vehicle.vin}).first()
+
+    def _refresh_last_charging_session(self, session: Session) -> None:
+        """
+        Make sure the cached last charging session is the current row of the database in the given session.
+        The session is looked up by its primary key, which needs no query while it is loaded in the identity map of the session.
+        Only if it was deleted from the database meanwhile, the most recent remaining charging session is loaded.
+
+        Args:
+            session (Session): The session to use.
+        """
+        if self.last_charging_session is None:
+            return
+        self.last_charging_session = self._get_current(session, self.last_charging_session)
+        if self.last_charging_session is None:
+            self.last_charging_session = self._load_last_charging_session(session)
+            if self.last_charging_session is not None:
+                LOG.info('Last charging session for vehicle %s was deleted from database, reloaded last charging session', self.vehicle.vin)
+            else:
+                LOG.info('Last charging session for vehicle %s was deleted from database, no more charging sessions found', self.vehicle.vin)
+
+    def _insert_row(self, session: Session, model: Type[Base], values: Dict[str, Any]) -> _RowSnapshot:
+        """
+        Insert a new row with a Core INSERT instead of adding an ORM instance to the session and going through the unit of work.
+        On databases supporting it, the INSERT is an upsert on the (vin, first_date) unique constraint. If a row starting at the same date
+        already exists, it is kept unchanged and returned, instead of failing with an IntegrityError that rolls back the session.
+
+        Args:
+            session (Session): The session to execute the INSERT in. The caller commits the transaction.
+            model (Type[Base]): The time series model to insert the row into.
+            values (Dict[str, Any]): The values of the new row.
+
+        Returns:
+            _RowSnapshot: The inserted row, this is the existing row if there was already one starting at the same date.
+        """
+        result = session.execute(self.insert_statements[model], values)
+        if self.upsert_supported:
+            values = dict(result.mappings().one())
+            row_id: int = values['id']
+        else:
+            row_id = result.inserted_primary_key[0]
+        return _RowSnapshot(model, row_id, values[_VALUE_COLUMNS[model]], values['first_date'], values['last_date'])
+
+    def _defer_last_date(self, row: _RowSnapshot, last_date: datetime) -> None:
+        """
+        Extend the last date of a row in memory and remember it to be written to the database with the next flush.
+
+        Args:
+            row (_RowSnapshot): The row to extend.
+            last_date (datetime): The new last date of the row.
+        """
+        row.last_date = last_date
+        with self.pending_last_dates_lock:
+            self.pending_last_dates.setdefault(row.model, {})[row.id] = last_date
+
+    def _write_pending_last_dates(self, session: Session, model: Optional[Type[Base]] = None) -> None:
+        """
+        Write the pending last dates with one UPDATE statement per table and commit them.
+        The lock is held while writing so that an older last date can never overwrite a newer one written concurrently.
+        If writing fails, the last dates are kept pending and written with the next attempt.
+
+        Args:
+            session (Session): The session to use.
+            model (Optional[Type[Base]]): Only write the pending last dates of this model, all models if None.
+        """
+        with self.pending_last_dates_lock:
+            if model is None:
+                pending: Dict[Type[Base], Dict[int, datetime]] = self.pending_last_dates
+            elif model in self.pending_last_dates:
+                pending = {model: self.pending_last_dates[model]}
+            else:
+                return
+            if not pending:
+                return
+            try:
+                for pending_model, last_dates in pending.items():
+                    session.execute(_LAST_DATE_UPDATE_STATEMENTS[pending_model],
+                                    [{'row_id': row_id, 'new_last_date': last_date} for row_id, last_date in last_dates.items()])
+                session.commit()
+                written: int = sum(len(last_dates) for last_dates in pending.values())
+                for pending_model in list(pending):
+                    del self.pending_last_dates[pending_model]
+                LOG.debug('Wrote %d deferred last dates for vehicle %s to database', written, self.vehicle.vin)
+            except DatabaseError as err:
+                session.rollback()
+                LOG.error('DatabaseError while writing deferred last dates for vehicle %s to database: %s', self.vehicle.vin, err)
+                self.database_plugin.report_database_error()
 
-    # pylint: disable=too-many-branches, too-many-statements
     def __on_charging_state_change(self, element: EnumAttribute[Charging.ChargingState], flags: Observable.ObserverEvent) -> None:
         del flags
+        if element.enabled:
+            self._queue_event(self._handle_charging_state_change, _Sample(element.value, element.last_updated, element.last_changed))
+
+    # pylint: disable=too-many-branches, too-many-statements
+    def _handle_charging_state_change(self, sample: _Sample) -> None:
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
 
-        if element.enabled:
-            with self.session_factory() as session:
-                self.vehicle = session.merge(self.vehicle)
-                session.refresh(self.vehicle)
-                with self.last_charging_state_lock:
-                    if self.last_charging_state is not None:
-                        try:
-                            self.last_charging_state = session.merge(self.last_charging_state)
-                            session.refresh(self.last_charging_state)
-                        except ObjectDeletedError:
-                            self.last_charging_state = session.query(ChargingState).filter(ChargingState.vehicle == self.vehicle)\
-                                .order_by(ChargingState.first_date.desc()).first()
-                            if self.last_charging_state is not None:
-                                LOG.info('Last charging state for vehicle %s was deleted from database, reloaded last charging state', self.vehicle.vin)
-                            else:
-                                LOG.info('Last charging state for vehicle %s was deleted from database, no more charging states found', self.vehicle.vin)
-                    if element.last_updated is not None \
-                            and (self.last_charging_state is None or (self.last_charging_state.state != element.value
-                                                                      and element.last_updated > self.last_charging_state.last_date)):
-                        new_charging_state: ChargingState = ChargingState(vin=self.vehicle.vin, first_date=element.last_updated,
-                                                                          last_date=element.last_updated, state=element.value)
-                        try:
-                            session.add(new_charging_state)
-                            session.commit()
-                            LOG.debug('Added new charging state %s for vehicle %s to database', element.value, self.vehicle.vin)
-                            self.last_charging_state = new_charging_state
-                        except IntegrityError as err:
-                            session.rollback()
-                            LOG.error('IntegrityError while adding charging state for vehicle %s to database: %s', self.vehicle.vin, err)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while adding charging state for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-
-                    elif self.last_charging_state is not None and self.last_charging_state.state == element.value and element.last_updated is not None:
-                        if self.last_charging_state.last_date is None or element.last_updated > self.last_charging_state.last_date:
-                            try:
-                                self.last_charging_state.last_date = element.last_updated
-                                session.commit()
-                                LOG.debug('Updated charging state %s for vehicle %s in database', element.value, self.vehicle.vin)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while updating charging state for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-
-                    with self.last_charging_session_lock:
-                        if self.last_charging_session is not None:
-                            try:
-                                self.last_charging_session = session.merge(self.last_charging_session)
-                                session.refresh(self.last_charging_session)
-                            except ObjectDeletedError:
-                                self.last_charging_session = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                                    .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                                              ChargingSession.plug_locked_date.desc().nulls_first(),
-                                              ChargingSession.plug_connected_date.desc().nulls_first()).first()
-
-                        if element.value in (Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION) \
-                                and self.carconnectivity_last_charging_state not in (Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION):
-                            if self.last_charging_session is None or self.last_charging_session.is_closed():
-                                # check that we are not resuming an old session
-                                allowed_interrupt: timedelta = timedelta(hours=24)
-                                # we allow longer CONSERVATION within the session
-                                if element.value == Charging.ChargingState.CONSERVATION:
-                                    allowed_interrupt = timedelta(hours=300)
-                                # We can reuse the session if the vehicle was connected and not disconnected in the meantime
-                                # And the session end date was not set or is within the allowed interrupt time
-                                # pylint: disable-next=too-many-boolean-expressions
-                                if self.last_charging_session is not None \
-                                        and not self.last_charging_session.was_disconnected() \
-                                        and (self.last_charging_session.session_end_date is None or element.last_changed is None
-                                             or self.last_charging_session.session_end_date > (element.last_changed - allowed_interrupt)):
-                                    LOG.debug("Continuing existing charging session for vehicle %s", self.vehicle.vin)
-                                    try:
-                                        self.last_charging_session.session_end_date = None
-                                        self.last_charging_session.end_level = None
-                                        self._update_session_charging_type(session, self.last_charging_session)
-                                        session.commit()
-                                    except DatabaseError as err:
-                                        session.rollback()
-                                        LOG.error('DatabaseError while updating charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                                else:
-                                    LOG.info("Starting new charging session for vehicle %s", self.vehicle.vin)
-                                    new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, session_start_date=element.last_changed)
-                                    try:
-                                        session.add(new_session)
-                                        LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
-                                        self._update_session_odometer(session, new_session)
-                                        self._update_session_position(session, new_session)
-                                        self._update_session_charging_type(session, new_session)
-                                        self.last_charging_session = new_session
-                                        session.commit()
-                                    except IntegrityError as err:
-                                        session.rollback()
-                                        LOG.error('IntegrityError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                    except DatabaseError as err:
-                                        session.rollback()
-                                        LOG.error('DatabaseError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                            else:
-                                if self.last_charging_session.was_started():
-                                    LOG.debug("Continuing existing charging session for vehicle %s", self.vehicle.vin)
-                                else:
-                                    LOG.debug("Starting charging in existing charging session for vehicle %s", self.vehicle.vin)
-                                    try:
-                                        if self.last_charging_session.session_start_date is None:
-                                            self.last_charging_session.session_start_date = element.last_changed
-                                        self._update_session_odometer(session, self.last_charging_session)
-                                        self._update_session_position(session, self.last_charging_session)
-                                        self._update_session_charging_type(session, self.last_charging_session)
-                                        session.commit()
-                                    except DatabaseError as err:
-                                        session.rollback()
-                                        LOG.error('DatabaseError while starting charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                            # Update startlevel at beginning of charging
-                            if self.last_charging_session is not None and isinstance(self.carconnectivity_vehicle, ElectricVehicle):
-                                electric_drive: Optional[ElectricDrive] = self.carconnectivity_vehicle.get_electric_drive()
-                                if electric_drive is not None and electric_drive.level.enabled and electric_drive.level.value is not None:
-                                    if self.last_charging_session.start_level is None:
-                                        try:
-                                            self.last_charging_session.start_level = electric_drive.level.value
-                                            session.commit()
-                                        except DatabaseError as err:
-                                            session.rollback()
-                                            LOG.error('DatabaseError while setting start level for vehicle %s in database: %s', self.vehicle.vin, err)
-                                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                        elif element.value not in (Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION) \
-                                and self.carconnectivity_last_charging_state in (Charging.ChargingState.CHARGING, Charging.ChargingState.CONSERVATION):
-                            if self.last_charging_session is not None and not self.last_charging_session.was_ended():
-                                LOG.info("Ending charging session for vehicle %s", self.vehicle.vin)
-                                try:
-                                    self.last_charging_session.session_end_date = element.last_changed
-                                    session.commit()
-                                except DatabaseError as err:
-                                    session.rollback()
-                                    LOG.error('DatabaseError while ending charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                                if isinstance(self.carconnectivity_vehicle, ElectricVehicle):
-                                    electric_drive: Optional[ElectricDrive] = self.carconnectivity_vehicle.get_electric_drive()
-                                    if electric_drive is not None and electric_drive.level.enabled and electric_drive.level.value is not None:
-                                        try:
-                                            self.last_charging_session.end_level = electric_drive.level.value
-                                            session.commit()
-                                        except DatabaseError as err:
-                                            session.rollback()
-                                            LOG.error('DatabaseError while setting start level for vehicle %s in database: %s', self.vehicle.vin, err)
-                                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    self.carconnectivity_last_charging_state = element.value
-            self.session_factory.remove()
+        # Same state as before, only the last date is extended. This is written deferred by flush() without a database access.
+        # The charging session is only changed on transitions, so without a transition the database is not accessed at all
+        if self.last_charging_state is not None and self.last_charging_state.value == sample.value:
+            if sample.last_updated is not None \
+                    and (self.last_charging_state.last_date is None or sample.last_updated > self.last_charging_state.last_date):
+                self._defer_last_date(self.last_charging_state, sample.last_updated)
+            if sample.value == self.carconnectivity_last_charging_state:
+                return
+        with self._session_scope() as session:
+            if sample.last_updated is not None \
+                    and (self.last_charging_state is None or (self.last_charging_state.value != sample.value
+                                                              and sample.last_updated > self.last_charging_state.last_date)):
+                self._write_pending_last_dates(session, ChargingState)
+                values: Dict[str, Any] = {'vin': self.vehicle.vin, 'first_date': sample.last_updated, 'last_date': sample.last_updated,
+                                          'state': sample.value}
+                try:
+                    new_charging_state: _RowSnapshot = self._insert_row(session, ChargingState, values)
+                    session.commit()
+                    LOG.debug('Added new charging state %s for vehicle %s to database', sample.value, self.vehicle.vin)
+                    self.last_charging_state = new_charging_state
+                except IntegrityError as err:
+                    session.rollback()
+                    LOG.error('IntegrityError while adding charging state for vehicle %s to database: %s', self.vehicle.vin, err)
+                except DatabaseError as err:
+                    session.rollback()
+                    LOG.error('DatabaseError while adding charging state for vehicle %s to database: %s', self.vehicle.vin, err)
+                    self.database_plugin.report_database_error()
+
+            self._refresh_last_charging_session(session)
+
+            transition: Optional[Callable[[Session, _Sample], None]] = self.charging_state_transitions.get(
+                (self.carconnectivity_last_charging_state in _CHARGING_STATES, sample.value in _CHARGING_STATES))
+            if transition is not None:
+                transition(session, sample)
+            self.carconnectivity_last_charging_state = sample.value
+
+    def _start_charging(self, session: Session, sample: _Sample) -> None:
+        """
+        Start a new charging session or continue the last one when the vehicle starts charging.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The charging state that started charging.
+        """
+        if self.last_charging_session is None or self.last_charging_session.is_closed():
+            # check that we are not resuming an old session
+            allowed_interrupt: timedelta = _ALLOWED_INTERRUPT
+            # we allow longer CONSERVATION within the session
+            if sample.value == Charging.ChargingState.CONSERVATION:
+                allowed_interrupt = _ALLOWED_CONSERVATION_INTERRUPT
+            # We can reuse the session if the vehicle was connected and not disconnected in the meantime
+            # And the session end date was not set or is within the allowed interrupt time
+            # pylint: disable-next=too-many-boolean-expressions
+            if self.last_charging_session is not None \
+                    and not self.last_charging_session.was_disconnected() \
+                    and (self.last_charging_session.session_end_date is None or sample.last_changed is None
+                         or self.last_charging_session.session_end_date > (sample.last_changed - allowed_interrupt)):
+                LOG.debug("Continuing existing charging session for vehicle %s", self.vehicle.vin)
+                with self._commit_scope(session, 'updating charging session'):
+                    self.last_charging_session.session_end_date = None
+                    self.last_charging_session.end_level = None
+                    self._update_session_charging_type(self.last_charging_session)
+                    self._update_session_start_level(self.last_charging_session)
+            else:
+                LOG.info("Starting new charging session for vehicle %s", self.vehicle.vin)
+                new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, session_start_date=sample.last_changed)
+                self._update_session_charging_type(new_session)
+                self._update_session_start_level(new_session)
+                self._add_charging_session(session, new_session)
+        else:
+            with self._commit_scope(session, 'starting charging session'):
+                if self.last_charging_session.was_started():
+                    LOG.debug("Continuing existing charging session for vehicle %s", self.vehicle.vin)
+                else:
+                    LOG.debug("Starting charging in existing charging session for vehicle %s", self.vehicle.vin)
+                    if self.last_charging_session.session_start_date is None:
+                        self.last_charging_session.session_start_date = sample.last_changed
+                    self._update_session_details(session, self.last_charging_session)
+                    self._update_session_charging_type(self.last_charging_session)
+                self._update_session_start_level(self.last_charging_session)
+
+    def _stop_charging(self, session: Session, sample: _Sample) -> None:
+        """
+        End the last charging session when the vehicle stops charging.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The charging state that stopped charging.
+        """
+        if self.last_charging_session is not None and not self.last_charging_session.was_ended():
+            LOG.info("Ending charging session for vehicle %s", self.vehicle.vin)
+            with self._commit_scope(session, 'ending charging session'):
+                self.last_charging_session.session_end_date = sample.last_changed
+                if self.electric_drive is not None and self.electric_drive.level.enabled and self.electric_drive.level.value is not None:
+                    self.last_charging_session.end_level = self.electric_drive.level.value
 
     def __on_charging_rate_change(self, element: SpeedAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
+        if element.enabled:
+            converted_value: Optional[float] = self._in_locale(element)
+            self._queue_event(self._handle_charging_rate_change, _Sample(converted_value, element.last_updated, element.last_changed))
+
+    def _handle_charging_rate_change(self, sample: _Sample) -> None:
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
-        if element.enabled:
-            converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
-            with self.last_charging_rate_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
-                    if self.last_charging_rate is not None:
-                        try:
-                            self.last_charging_rate = session.merge(self.last_charging_rate)
-                            session.refresh(self.last_charging_rate)
-                        except ObjectDeletedError:
-                            self.last_charging_rate = session.query(ChargingRate).filter(ChargingRate.vehicle == self.vehicle)\
-                                .order_by(ChargingRate.first_date.desc()).first()
-                            if self.last_charging_rate is not None:
-                                LOG.info('Last charging rate for vehicle %s was deleted from database, reloaded last charging rate', self.vehicle.vin)
-                            else:
-                                LOG.info('Last charging rate for vehicle %s was deleted from database, no more charging rates found', self.vehicle.vin)
-                    if element.last_updated is not None \
-                            and (self.last_charging_rate is None or (self.last_charging_rate.rate != converted_value
-                                                                     and element.last_updated > self.last_charging_rate.last_date)):
-                        new_charging_rate: ChargingRate = ChargingRate(vin=self.vehicle.vin, first_date=element.last_updated,
-                                                                       last_date=element.last_updated, rate=converted_value)
-                        try:
-                            session.add(new_charging_rate)
-                            session.commit()
-                            LOG.debug('Added new charging rate %s for vehicle %s to database', converted_value, self.vehicle.vin)
-                            self.last_charging_rate = new_charging_rate
-                        except IntegrityError as err:
-                            session.rollback()
-                            LOG.error('IntegrityError while adding charging rate for vehicle %s to database: %s', self.vehicle.vin, err)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while adding charging rate for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif self.last_charging_rate is not None and self.last_charging_rate.rate == converted_value and element.last_updated is not None:
-                        if self.last_charging_rate.last_date is None or element.last_updated > self.last_charging_rate.last_date:
-                            try:
-                                self.last_charging_rate.last_date = element.last_updated
-                                session.commit()
-                                LOG.debug('Updated charging rate %s for vehicle %s in database', converted_value, self.vehicle.vin)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while updating charging rate for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+
+        converted_value: Optional[float] = sample.value
+        # Same charging rate as before, only the last date is extended. This is written deferred by flush() without a database access
+        if self.last_charging_rate is not None and self.last_charging_rate.value == converted_value:
+            if sample.last_updated is not None \
+                    and (self.last_charging_rate.last_date is None or sample.last_updated > self.last_charging_rate.last_date):
+                self._defer_last_date(self.last_charging_rate, sample.last_updated)
+        elif sample.last_updated is not None \
+                and (self.last_charging_rate is None or sample.last_updated > self.last_charging_rate.last_date):
+            with self._session_scope() as session:
+                self._write_pending_last_dates(session, ChargingRate)
+                values: Dict[str, Any] = {'vin': self.vehicle.vin, 'first_date': sample.last_updated, 'last_date': sample.last_updated,
+                                          'rate': converted_value}
+                try:
+                    new_charging_rate: _RowSnapshot = self._insert_row(session, ChargingRate, values)
+                    session.commit()
+                    LOG.debug('Added new charging rate %s for vehicle %s to database', converted_value, self.vehicle.vin)
+                    self.last_charging_rate = new_charging_rate
+                except IntegrityError as err:
+                    session.rollback()
+                    LOG.error('IntegrityError while adding charging rate for vehicle %s to database: %s', self.vehicle.vin, err)
+                except DatabaseError as err:
+                    session.rollback()
+                    LOG.error('DatabaseError while adding charging rate for vehicle %s to database: %s', self.vehicle.vin, err)
+                    self.database_plugin.report_database_error()
 
     def __on_charging_power_change(self, element: PowerAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
+        if element.enabled:
+            converted_value: Optional[float] = self._in_locale(element)
+            self._queue_event(self._handle_charging_power_change, _Sample(converted_value, element.last_updated, element.last_changed))
+
+    def _handle_charging_power_change(self, sample: _Sample) -> None:
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
-        if element.enabled:
-            converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
-            with self.last_charging_power_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
-                    if self.last_charging_power is not None:
-                        try:
-                            self.last_charging_power = session.merge(self.last_charging_power)
-                            session.refresh(self.last_charging_power)
-                        except ObjectDeletedError:
-                            self.last_charging_power = session.query(ChargingPower).filter(ChargingPower.vehicle == self.vehicle)\
-                                .order_by(ChargingPower.first_date.desc()).first()
-                            if self.last_charging_power is not None:
-                                LOG.info('Last charging power for vehicle %s was deleted from database, reloaded last charging power', self.vehicle.vin)
-                            else:
-                                LOG.info('Last charging power for vehicle %s was deleted from database, no more charging powers found', self.vehicle.vin)
-                    if element.last_updated is not None \
-                            and (self.last_charging_power is None or (self.last_charging_power.power != converted_value
-                                                                      and element.last_updated > self.last_charging_power.last_date)):
-                        new_charging_power: ChargingPower = ChargingPower(vin=self.vehicle.vin, first_date=element.last_updated,
-                                                                          last_date=element.last_updated, power=converted_value)
-                        try:
-                            session.add(new_charging_power)
-                            session.commit()
-                            LOG.debug('Added new charging power %s for vehicle %s to database', converted_value, self.vehicle.vin)
-                            self.last_charging_power = new_charging_power
-                        except IntegrityError as err:
-                            session.rollback()
-                            LOG.error('IntegrityError while adding charging power for vehicle %s to database: %s', self.vehicle.vin, err)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while adding charging power for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif self.last_charging_power is not None and self.last_charging_power.power == converted_value and element.last_updated is not None:
-                        if self.last_charging_power.last_date is None or element.last_updated > self.last_charging_power.last_date:
-                            try:
-                                self.last_charging_power.last_date = element.last_updated
-                                LOG.debug('Updated charging power %s for vehicle %s in database', converted_value, self.vehicle.vin)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while updating charging power for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
 
-    # pylint: disable=too-many-branches, too-many-statements
+        converted_value: Optional[float] = sample.value
+        # Same charging power as before, only the last date is extended. This is written deferred by flush() without a database access
+        if self.last_charging_power is not None and self.last_charging_power.value == converted_value:
+            if sample.last_updated is not None \
+                    and (self.last_charging_power.last_date is None or sample.last_updated > self.last_charging_power.last_date):
+                self._defer_last_date(self.last_charging_power, sample.last_updated)
+        elif sample.last_updated is not None \
+                and (self.last_charging_power is None or sample.last_updated > self.last_charging_power.last_date):
+            with self._session_scope() as session:
+                self._write_pending_last_dates(session, ChargingPower)
+                values: Dict[str, Any] = {'vin': self.vehicle.vin, 'first_date': sample.last_updated, 'last_date': sample.last_updated,
+                                          'power': converted_value}
+                try:
+                    new_charging_power: _RowSnapshot = self._insert_row(session, ChargingPower, values)
+                    session.commit()
+                    LOG.debug('Added new charging power %s for vehicle %s to database', converted_value, self.vehicle.vin)
+                    self.last_charging_power = new_charging_power
+                except IntegrityError as err:
+                    session.rollback()
+                    LOG.error('IntegrityError while adding charging power for vehicle %s to database: %s', self.vehicle.vin, err)
+                except DatabaseError as err:
+                    session.rollback()
+                    LOG.error('DatabaseError while adding charging power for vehicle %s to database: %s', self.vehicle.vin, err)
+                    self.database_plugin.report_database_error()
+
     def __on_connector_state_change(self, element: EnumAttribute[ChargingConnector.ChargingConnectorConnectionState], flags: Observable.ObserverEvent) -> None:
         del flags
+        self._queue_event(self._handle_connector_state_change, _Sample(element.value, element.last_updated, element.last_changed))
+
+    def _handle_connector_state_change(self, sample: _Sample) -> None:
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
 
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            with self.last_charging_session_lock:
-                if self.last_charging_session is not None:
-                    try:
-                        self.last_charging_session = session.merge(self.last_charging_session)
-                        session.refresh(self.last_charging_session)
-                    except ObjectDeletedError:
-                        self.last_charging_session = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                            .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                                      ChargingSession.plug_locked_date.desc().nulls_first(),
-                                      ChargingSession.plug_connected_date.desc().nulls_first()).first()
-                        if self.last_charging_session is not None:
-                            LOG.info('Last charging session for vehicle %s was deleted from database, reloaded last charging session', self.vehicle.vin)
-                        else:
-                            LOG.info('Last charging session for vehicle %s was deleted from database, no more charging sessions found', self.vehicle.vin)
-                if element.value == ChargingConnector.ChargingConnectorConnectionState.CONNECTED \
-                        and self.carconnectivity_last_connector_state is not None \
-                        and self.carconnectivity_last_connector_state != ChargingConnector.ChargingConnectorConnectionState.CONNECTED:
-                    if self.last_charging_session is None or self.last_charging_session.is_closed():
-                        LOG.info("Starting new charging session for vehicle %s  due to connector connected state", self.vehicle.vin)
-                        new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, plug_connected_date=element.last_changed)
-                        try:
-                            session.add(new_session)
-                            self._update_session_odometer(session, new_session)
-                            self._update_session_position(session, new_session)
-                            session.commit()
-                            LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
-                            self.last_charging_session = new_session
-                        except IntegrityError as err:
-                            session.rollback()
-                            LOG.error('IntegrityError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif not self.last_charging_session.was_connected():
-                        LOG.debug("Continuing existing charging session for vehicle %s, writing connected date", self.vehicle.vin)
-                        try:
-                            self.last_charging_session.plug_connected_date = element.last_changed
-                            self._update_session_odometer(session, self.last_charging_session)
-                            self._update_session_position(session, self.last_charging_session)
-                            session.commit()
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while starting charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                elif element.value != ChargingConnector.ChargingConnectorConnectionState.CONNECTED \
-                        and self.carconnectivity_last_connector_state == ChargingConnector.ChargingConnectorConnectionState.CONNECTED:
-                    if self.last_charging_session is not None and not self.last_charging_session.was_disconnected():
-                        LOG.info("Writing plug disconnected date for charging session of vehicle %s", self.vehicle.vin)
-                        try:
-                            self.last_charging_session.plug_disconnected_date = element.last_changed
-                            session.commit()
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while ending charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                # Create charging session when connected at startup
-                elif element.value == ChargingConnector.ChargingConnectorConnectionState.CONNECTED \
-                        and self.carconnectivity_last_connector_state == ChargingConnector.ChargingConnectorConnectionState.CONNECTED:
-                    if self.last_charging_session is None or self.last_charging_session.is_closed():
-                        # when the incoming connected state was during the last session, this is a continuation
-                        if self.last_charging_session is None or element.last_changed is not None and element.last_changed > \
-                                (self.last_charging_session.session_end_date
-                                 or self.last_charging_session.plug_unlocked_date
-                                 or datetime.min.replace(tzinfo=timezone.utc)):
-                            LOG.info("Starting new charging session for vehicle %s due to connector connected state on startup", self.vehicle.vin)
-                            new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, plug_connected_date=element.last_changed)
-                            try:
-                                session.add(new_session)
-                                self._update_session_odometer(session, new_session)
-                                self._update_session_position(session, new_session)
-                                session.commit()
-                                LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
-                                self.last_charging_session = new_session
-                            except IntegrityError as err:
-                                session.rollback()
-                                LOG.error('IntegrityError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif self.last_charging_session is not None and not self.last_charging_session.was_connected():
-                        try:
-                            self.last_charging_session.plug_connected_date = element.last_changed
-                            session.commit()
-                            LOG.info("Writing plug connected date for charging session of vehicle %s", self.vehicle.vin)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while changing charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.carconnectivity_last_connector_state = element.value
-        self.session_factory.remove()
+        with self._session_scope() as session:
+            self._refresh_last_charging_session(session)
+            # Nothing is known about the plug before the first connection state, so only the transitions after it are handled
+            if self.carconnectivity_last_connector_state is not None:
+                transition: Optional[Callable[[Session, _Sample], None]] = self.connector_state_transitions.get(
+                    (self.carconnectivity_last_connector_state == ChargingConnector.ChargingConnectorConnectionState.CONNECTED,
+                     sample.value == ChargingConnector.ChargingConnectorConnectionState.CONNECTED))
+                if transition is not None:
+                    transition(session, sample)
+            self.carconnectivity_last_connector_state = sample.value
+
+    def _connect_plug(self, session: Session, sample: _Sample, on_startup: bool = False) -> None:
+        """
+        Start a new charging session or write the connected date of the last one when the plug is connected.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The connection state that connected the plug.
+            on_startup (bool): The plug was already connected before, this is the connection state found on startup.
+        """
+        if self.last_charging_session is None or self.last_charging_session.is_closed():
+            # when the incoming connected state was during the last session, this is a continuation
+            if on_startup and self.last_charging_session is not None \
+                    and (sample.last_changed is None
+                         or sample.last_changed <= (self.last_charging_session.session_end_date or self.last_charging_session.plug_unlocked_date or _MIN_DATE)):
+                return
+            LOG.info("Starting new charging session for vehicle %s due to connector connected state%s", self.vehicle.vin, ' on startup' if on_startup else '')
+            self._add_charging_session(session, ChargingSession(vin=self.vehicle.vin, plug_connected_date=sample.last_changed))
+        elif not self.last_charging_session.was_connected():
+            LOG.info("Writing plug connected date for charging session of vehicle %s", self.vehicle.vin)
+            with self._commit_scope(session, 'starting charging session'):
+                self._update_columns(session, self.last_charging_session, {'plug_connected_date': sample.last_changed})
+                if not on_startup:
+                    self._update_session_details(session, self.last_charging_session)
+
+    def _disconnect_plug(self, session: Session, sample: _Sample) -> None:
+        """
+        Write the disconnected date of the last charging session when the plug is disconnected.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The connection state that disconnected the plug.
+        """
+        if self.last_charging_session is not None and not self.last_charging_session.was_disconnected():
+            LOG.info("Writing plug disconnected date for charging session of vehicle %s", self.vehicle.vin)
+            with self._commit_scope(session, 'ending charging session'):
+                self._update_columns(session, self.last_charging_session, {'plug_disconnected_date': sample.last_changed})
 
     def __on_connector_lock_state_change(self, element: EnumAttribute[ChargingConnector.ChargingConnectorLockState], flags: Observable.ObserverEvent) -> None:
         del flags
-        if self.carconnectivity_vehicle is None:
-            raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
+        self._queue_event(self._handle_connector_lock_state_change, _Sample(element.value, element.last_updated, element.last_changed))
 
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            with self.last_charging_session_lock:
-                if self.last_charging_session is not None:
-                    try:
-                        self.last_charging_session = session.merge(self.last_charging_session)
-                        session.refresh(self.last_charging_session)
-                    except ObjectDeletedError:
-                        self.last_charging_session = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                            .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                                      ChargingSession.plug_locked_date.desc().nulls_first(),
-                                      ChargingSession.plug_connected_date.desc().nulls_first()).first()
-                        if self.last_charging_session is not None:
-                            LOG.info('Last charging session for vehicle %s was deleted from database, reloaded last charging session', self.vehicle.vin)
-                        else:
-                            LOG.info('Last charging session for vehicle %s was deleted from database, no more charging sessions found', self.vehicle.vin)
-                if element.value == ChargingConnector.ChargingConnectorLockState.LOCKED \
-                        and self.carconnectivity_last_connector_lock_state is not None \
-                        and self.carconnectivity_last_connector_lock_state != ChargingConnector.ChargingConnectorLockState.LOCKED:
-                    if self.last_charging_session is None or self.last_charging_session.is_closed():
-                        # In case this was an interrupted charging session (interrupt no longer than 24hours), continue by erasing end time
-                        if self.last_charging_session is not None and not self.last_charging_session.was_disconnected() \
-                            and (self.last_charging_session.plug_unlocked_date is None
-                                 or self.last_charging_session.plug_unlocked_date > ((element.last_changed or datetime.now(timezone.utc))
-                                                                                     - timedelta(hours=24))):
-                            LOG.debug("found a closed charging session that was not disconneced. This could be an interrupted session we want to continue")
-                            try:
-                                self.last_charging_session.plug_unlocked_date = None
-                                session.commit()
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while changing charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                        else:
-                            LOG.info("Starting new charging session for vehicle %s due to connector locked state", self.vehicle.vin)
-                            new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, plug_locked_date=element.last_changed)
-                            try:
-                                session.add(new_session)
-                                self._update_session_odometer(session, new_session)
-                                self._update_session_position(session, new_session)
-                                session.commit()
-                                LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
-                                self.last_charging_session = new_session
-                            except IntegrityError as err:
-                                session.rollback()
-                                LOG.error('IntegrityError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif not self.last_charging_session.was_locked():
-                        LOG.debug("Continuing existing charging session for vehicle %s, writing locked date", self.vehicle.vin)
-                        try:
-                            self.last_charging_session.plug_locked_date = element.last_changed
-                            self._update_session_odometer(session, self.last_charging_session)
-                            self._update_session_position(session, self.last_charging_session)
-                            session.commit()
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while starting charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                elif element.value != ChargingConnector.ChargingConnectorLockState.LOCKED \
-                        and self.carconnectivity_last_connector_lock_state == ChargingConnector.ChargingConnectorLockState.LOCKED:
-                    if self.last_charging_session is not None and not self.last_charging_session.was_unlocked():
-                        LOG.info("Writing plug unlocked date for charging session of vehicle %s", self.vehicle.vin)
-                        try:
-                            self.last_charging_session.plug_unlocked_date = element.last_changed
-                            session.commit()
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while ending charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                # Create charging session when locked at startup
-                elif element.value == ChargingConnector.ChargingConnectorLockState.LOCKED \
-                        and self.carconnectivity_last_connector_lock_state == ChargingConnector.ChargingConnectorLockState.LOCKED:
-                    if self.last_charging_session is None or self.last_charging_session.is_closed():
-                        # In case this was an interrupted charging session (interrupt no longer than 24hours), continue by erasing end time
-                        if self.last_charging_session is not None and not self.last_charging_session.was_disconnected() \
-                            and (self.last_charging_session.plug_unlocked_date is None
-                                 or self.last_charging_session.plug_unlocked_date > ((element.last_changed or datetime.now(timezone.utc))
-                                                                                     - timedelta(hours=24))):
-                            LOG.debug("found a closed charging session that was not disconneced. This could be an interrupted session we want to continue")
-                            try:
-                                self.last_charging_session.plug_unlocked_date = None
-                                session.commit()
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while changing charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                        else:
-                            LOG.info("Starting new charging session for vehicle %s due to connector locked state on startup", self.vehicle.vin)
-                            new_session: ChargingSession = ChargingSession(vin=self.vehicle.vin, plug_locked_date=element.last_changed)
-                            try:
-                                session.add(new_session)
-                                self._update_session_odometer(session, new_session)
-                                self._update_session_position(session, new_session)
-                                session.commit()
-                                LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
-                                self.last_charging_session = new_session
-                            except IntegrityError as err:
-                                session.rollback()
-                                LOG.error('IntegrityError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while adding charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif self.last_charging_session is not None and not self.last_charging_session.was_locked():
-                        try:
-                            self.last_charging_session.plug_locked_date = element.last_changed
-                            session.commit()
-                            LOG.info("Writing plug locked date for charging session of vehicle %s", self.vehicle.vin)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while changing charging session for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.carconnectivity_last_connector_lock_state = element.value
-        self.session_factory.remove()
-
-    def _update_session_odometer(self, session: Session, charging_session: ChargingSession) -> None:
+    def _handle_connector_lock_state_change(self, sample: _Sample) -> None:
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
-        if self.carconnectivity_vehicle.odometer.enabled:
-            converted_odometer: Optional[float] = self.carconnectivity_vehicle.odometer.in_locale(locale=self.database_plugin.locale)[0]
-            if charging_session.session_odometer is None:
-                try:
-                    charging_session.session_odometer = converted_odometer
-                except DatabaseError as err:
-                    session.rollback()
-                    LOG.error('DatabaseError while updating odometer for charging session of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
 
-    def _update_session_charging_type(self, session: Session, charging_session: ChargingSession) -> None:
-        if self.carconnectivity_vehicle is None:
-            raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
+        with self._session_scope() as session:
+            self._refresh_last_charging_session(session)
+            # Nothing is known about the plug before the first lock state, so only the transitions after it are handled
+            if self.carconnectivity_last_connector_lock_state is not None:
+                transition: Optional[Callable[[Session, _Sample], None]] = self.connector_lock_state_transitions.get(
+                    (self.carconnectivity_last_connector_lock_state == ChargingConnector.ChargingConnectorLockState.LOCKED,
+                     sample.value == ChargingConnector.ChargingConnectorLockState.LOCKED))
+                if transition is not None:
+                    transition(session, sample)
+            self.carconnectivity_last_connector_lock_state = sample.value
+
+    def _lock_plug(self, session: Session, sample: _Sample, on_startup: bool = False) -> None:
+        """
+        Start a new charging session, continue an interrupted one or write the locked date of the last one when the plug is locked.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The lock state that locked the plug.
+            on_startup (bool): The plug was already locked before, this is the lock state found on startup.
+        """
+        if self.last_charging_session is None or self.last_charging_session.is_closed():
+            # In case this was an interrupted charging session (interrupt no longer than 24hours), continue by erasing end time
+            if self.last_charging_session is not None and not self.last_charging_session.was_disconnected() \
+                and (self.last_charging_session.plug_unlocked_date is None
+                     or self.last_charging_session.plug_unlocked_date > ((sample.last_changed or datetime.now(timezone.utc)) - _ALLOWED_INTERRUPT)):
+                LOG.debug("found a closed charging session that was not disconneced. This could be an interrupted session we want to continue")
+                with self._commit_scope(session, 'changing charging session'):
+                    self._update_columns(session, self.last_charging_session, {'plug_unlocked_date': None})
+            else:
+                LOG.info("Starting new charging session for vehicle %s due to connector locked state%s", self.vehicle.vin, ' on startup' if on_startup else '')
+                self._add_charging_session(session, ChargingSession(vin=self.vehicle.vin, plug_locked_date=sample.last_changed))
+        elif not self.last_charging_session.was_locked():
+            LOG.info("Writing plug locked date for charging session of vehicle %s", self.vehicle.vin)
+            with self._commit_scope(session, 'starting charging session'):
+                self._update_columns(session, self.last_charging_session, {'plug_locked_date': sample.last_changed})
+                if not on_startup:
+                    self._update_session_details(session, self.last_charging_session)
+
+    def _unlock_plug(self, session: Session, sample: _Sample) -> None:
+        """
+        Write the unlocked date of the last charging session when the plug is unlocked.
+
+        Args:
+            session (Session): The session to use.
+            sample (_Sample): The lock state that unlocked the plug.
+        """
+        if self.last_charging_session is not None and not self.last_charging_session.was_unlocked():
+            LOG.info("Writing plug unlocked date for charging session of vehicle %s", self.vehicle.vin)
+            with self._commit_scope(session, 'ending charging session'):
+                self._update_columns(session, self.last_charging_session, {'plug_unlocked_date': sample.last_changed})
+
+    def _add_charging_session(self, session: Session, new_session: ChargingSession) -> None:
+        """
+        Add a new charging session with the current odometer and position and make it the last charging session once it is committed.
+
+        Args:
+            session (Session): The session to use.
+            new_session (ChargingSession): The new charging session.
+        """
+        with self._commit_scope(session, 'adding charging session'):
+            session.add(new_session)
+            self._update_session_details(session, new_session)
+        # The rollback after a failed commit expunges the new charging session again
+        if inspect(new_session).persistent:
+            LOG.debug('Added new charging session for vehicle %s to database', self.vehicle.vin)
+            self.last_charging_session = new_session
+
+    def _update_session_start_level(self, charging_session: ChargingSession) -> None:
+        if self.electric_drive is not None and self.electric_drive.level.enabled and self.electric_drive.level.value is not None:
+            if charging_session.start_level is None:
+                charging_session.start_level = self.electric_drive.level.value
+
+    def _update_session_charging_type(self, charging_session: ChargingSession) -> None:
         if isinstance(self.carconnectivity_vehicle, ElectricVehicle) and self.carconnectivity_vehicle.charging.type.enabled \
                 and self.carconnectivity_vehicle.charging.type.value is not None:
             if charging_session.charging_type is None:
-                try:
-                    charging_session.charging_type = self.carconnectivity_vehicle.charging.type.value
-                except DatabaseError as err:
-                    session.rollback()
-                    LOG.error('DatabaseError while updating charging type for charging session of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-
-    def _update_session_position(self, session: Session, charging_session: ChargingSession) -> None:
+                charging_session.charging_type = self.carconnectivity_vehicle.charging.type.value
+
+    def _update_session_details(self, session: Session, charging_session: ChargingSession) -> None:
+        """
+        Fill in the odometer, position, location and charging station of a charging session where they are not known yet.
+        Only writing the location and charging station accesses the database. Database errors are raised to the caller, which rolls
+        back the whole change of the charging session.
+
+        Args:
+            session (Session): The session to use.
+            charging_session (ChargingSession): The charging session to update.
+        """
         if self.carconnectivity_vehicle is None:
             raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
-        if self.carconnectivity_vehicle.position.enabled and self.carconnectivity_vehicle.position.latitude.enabled \
-                and self.carconnectivity_vehicle.position.longitude.enabled \
-                and self.carconnectivity_vehicle.position.latitude.value is not None \
-                and self.carconnectivity_vehicle.position.longitude.value is not None:
+        if charging_session.session_odometer is None and self.carconnectivity_vehicle.odometer.enabled:
+            charging_session.session_odometer = self.carconnectivity_vehicle.odometer.in_locale(locale=self.database_plugin.locale)[0]
+        position = self.carconnectivity_vehicle.position
+        if position.enabled and position.latitude.enabled and position.longitude.enabled \
+                and position.latitude.value is not None and position.longitude.value is not None:
             if charging_session.session_position_latitude is None and charging_session.session_position_longitude is None:
-                try:
-                    charging_session.session_position_latitude = self.carconnectivity_vehicle.position.latitude.value
-                    charging_session.session_position_longitude = self.carconnectivity_vehicle.position.longitude.value
-                except DatabaseError as err:
-                    session.rollback()
-                    LOG.error('DatabaseError while updating position for charging session of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            if charging_session.location is None and self.carconnectivity_vehicle.position.location.enabled:
-                location: Location = Location.from_carconnectivity_location(location=self.carconnectivity_vehicle.position.location)
-                try:
-                    location = session.merge(location)
-                    charging_session.location = location
-                except DatabaseError as err:
-                    session.rollback()
-                    LOG.error('DatabaseError while merging location for charging session of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-        if charging_session.charging_station is None \
+                charging_session.session_position_latitude = position.latitude.value
+                charging_session.session_position_longitude = position.longitude.value
+            if charging_session.location_uid is None and position.location.enabled:
+                location: Location = Location.from_carconnectivity_location(location=position.location)
+                charging_session.location_uid = self._upsert_by_uid(session, location)
+        if charging_session.charging_station_uid is None \
                 and isinstance(self.carconnectivity_vehicle, ElectricVehicle) and self.carconnectivity_vehicle.charging is not None \
                 and self.carconnectivity_vehicle.charging.enabled and self.carconnectivity_vehicle.charging.charging_station.enabled:
             charging_station: ChargingStation = ChargingStation.from_carconnectivity_charging_station(
                 charging_station=self.carconnectivity_vehicle.charging.charging_station)
-            try:
-                charging_station = session.merge(charging_station)
-                charging_session.charging_station = charging_station
-            except DatabaseError as err:
-                session.rollback()
-                LOG.error('DatabaseError while merging charging station for charging session of vehicle %s in database: %s', self.vehicle.vin, err)
-                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+            charging_session.charging_station_uid = self._upsert_by_uid(session, charging_station)
 
     def _on_charging_type_change(self, element: EnumAttribute[Charging.ChargingType], flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
-            with self.session_factory() as session:
-                self.vehicle = session.merge(self.vehicle)
-                session.refresh(self.vehicle)
-                with self.last_charging_session_lock:
-                    if self.last_charging_session is not None:
-                        try:
-                            self.last_charging_session = session.merge(self.last_charging_session)
-                            session.refresh(self.last_charging_session)
-                        except ObjectDeletedError:
-                            self.last_charging_session = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                                .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                                          ChargingSession.plug_locked_date.desc().nulls_first(),
-                                          ChargingSession.plug_connected_date.desc().nulls_first()).first()
-                            if self.last_charging_session is not None:
-                                LOG.info('Last charging session for vehicle %s was deleted from database, reloaded last charging session', self.vehicle.vin)
-                            else:
-                                LOG.info('Last charging session for vehicle %s was deleted from database, no more charging sessions found', self.vehicle.vin)
-                    if self.last_charging_session is not None and not self.last_charging_session.is_closed() \
-                            and element.value in [Charging.ChargingType.AC, Charging.ChargingType.DC]:
-                        try:
-                            self.last_charging_session.charging_type = element.value
-                            session.commit()
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while updating type of charging session for vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+            self._queue_event(self._handle_charging_type_change, _Sample(element.value, element.last_updated, element.last_changed))
+
+    def _handle_charging_type_change(self, sample: _Sample) -> None:
+        with self._session_scope() as session:
+            self._refresh_last_charging_session(session)
+            if self.last_charging_session is not None and not self.last_charging_session.is_closed() \
+                    and sample.value in [Charging.ChargingType.AC, Charging.ChargingType.DC]:
+                with self._commit_scope(session, 'updating type of charging session'):
+                    self.last_charging_session.charging_type = sample.value
 
     def _on_battery_level_change(self, element: FloatAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled and element.value is not None:
-            # We try to see if there was a late battery level update for a finished session
-            with self.session_factory() as session:
-                self.vehicle = session.merge(self.vehicle)
-                session.refresh(self.vehicle)
-                with self.last_charging_session_lock:
-                    if self.last_charging_session is not None:
-                        try:
-                            self.last_charging_session = session.merge(self.last_charging_session)
-                            session.refresh(self.last_charging_session)
-                        except ObjectDeletedError:
-                            self.last_charging_session = session.query(ChargingSession).filter(ChargingSession.vehicle == self.vehicle) \
-                                .order_by(ChargingSession.session_start_date.desc().nulls_first(),
-                                          ChargingSession.plug_locked_date.desc().nulls_first(),
-                                          ChargingSession.plug_connected_date.desc().nulls_first()).first()
-                            if self.last_charging_session is not None:
-                                LOG.info('Last charging session for vehicle %s was deleted from database, reloaded last charging session', self.vehicle.vin)
-                            else:
-                                LOG.info('Last charging session for vehicle %s was deleted from database, no more charging sessions found', self.vehicle.vin)
-                    if self.last_charging_session is not None and self.last_charging_session.session_end_date is not None:
-                        if element.last_updated is not None and (element.last_updated <= (self.last_charging_session.session_end_date + timedelta(minutes=1))):
-                            # Only update if we have no end level yet or the new level is higher than the previous one (this happens with late level updates)
-                            if self.last_charging_session.end_level is None or self.last_charging_session.end_level < element.value:
-                                try:
-                                    self.last_charging_session.end_level = element.value
-                                    session.commit()
-                                except DatabaseError as err:
-                                    session.rollback()
-                                    LOG.error('DatabaseError while updating battery level of charging session for vehicle %s in database: %s',
-                                              self.vehicle.vin, err)
-                                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+            self._queue_event(self._handle_battery_level_change, _Sample(element.value, element.last_updated, element.last_changed))
+
+    def _handle_battery_level_change(self, sample: _Sample) -> None:
+        # We try to see if there was a late battery level update for a finished session
+        with self._session_scope() as session:
+            self._refresh_last_charging_session(session)
+            if self.last_charging_session is not None and self.last_charging_session.session_end_date is not None:
+                if sample.last_updated is not None and (sample.last_updated <= (self.last_charging_session.session_end_date + _LATE_END_LEVEL)):
+                    # Only update if we have no end level yet or the new level is higher than the previous one (this happens with late level updates)
+                    if self.last_charging_session.end_level is None or self.last_charging_session.end_level < sample.value:
+                        with self._commit_scope(session, 'updating battery level of charging session'):
+                            self._update_columns(session, self.last_charging_session, {'end_level': sample.value})
 
     def __on_battery_temperature_change(self, element: TemperatureAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
-            converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
-            with self.last_battery_temperature_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
-                    if self.last_battery_temperature is not None:
-                        try:
-                            self.last_battery_temperature = session.merge(self.last_battery_temperature)
-                            session.refresh(self.last_battery_temperature)
-                        except ObjectDeletedError:
-                            self.last_battery_temperature = session.query(BatteryTemperature).filter(BatteryTemperature.vehicle == self.vehicle)\
-                                .order_by(BatteryTemperature.first_date.desc()).first()
-                            if self.last_battery_temperature is not None:
-                                LOG.info('Last battery temperature for vehicle %s was deleted from database, reloaded last battery temperature',
-                                         self.vehicle.vin)
-                            else:
-                                LOG.info('Last battery temperature for vehicle %s was deleted from database, no more battery temperatures found',
-                                         self.vehicle.vin)
-                    if element.last_updated is not None \
-                            and (self.last_battery_temperature is None or (self.last_battery_temperature.battery_temperature != converted_value
-                                                                           and element.last_updated > self.last_battery_temperature.last_date)):
-                        new_battery_temperature: BatteryTemperature = BatteryTemperature(vin=self.vehicle.vin, first_date=element.last_updated,
-                                                                                         last_date=element.last_updated, battery_temperature=converted_value)
-                        try:
-                            session.add(new_battery_temperature)
-                            session.commit()
-                            LOG.debug('Added new battery temperature %.2f for vehicle %s to database', converted_value, self.vehicle.vin)
-                            self.last_battery_temperature = new_battery_temperature
-                        except IntegrityError as err:
-                            session.rollback()
-                            LOG.error('IntegrityError while adding battery temperature for vehicle %s to database: %s', self.vehicle.vin, err)
-                        except DatabaseError as err:
-                            session.rollback()
-                            LOG.error('DatabaseError while adding battery temperature for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    elif self.last_battery_temperature is not None and self.last_battery_temperature.battery_temperature == converted_value \
-                            and element.last_updated is not None:
-                        if self.last_battery_temperature.last_date is None or element.last_updated > self.last_battery_temperature.last_date:
-                            try:
-                                self.last_battery_temperature.last_date = element.last_updated
-                                session.commit()
-                                LOG.debug('Updated battery temperature %.2f for vehicle %s in database', converted_value, self.vehicle.vin)
-                            except DatabaseError as err:
-                                session.rollback()
-                                LOG.error('DatabaseError while updating battery temperature for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+            converted_value: Optional[float] = self._in_locale(element)
+            self._queue_event(self._handle_battery_temperature_change, _Sample(converted_value, element.last_updated, element.last_changed))
+
+    def _handle_battery_temperature_change(self, sample: _Sample) -> None:
+        converted_value: Optional[float] = sample.value
+        # Same battery temperature as before, only the last date is extended. This is written deferred by flush() without a database access
+        if self.last_battery_temperature is not None and self.last_battery_temperature.value == converted_value:
+            if sample.last_updated is not None \
+                    and (self.last_battery_temperature.last_date is None or sample.last_updated > self.last_battery_temperature.last_date):
+                self._defer_last_date(self.last_battery_temperature, sample.last_updated)
+        elif sample.last_updated is not None \
+                and (self.last_battery_temperature is None or sample.last_updated > self.last_battery_temperature.last_date):
+            with self._session_scope() as session:
+                self._write_pending_last_dates(session, BatteryTemperature)
+                values: Dict[str, Any] = {'vin': self.vehicle.vin, 'first_date': sample.last_updated, 'last_date': sample.last_updated,
+                                          'battery_temperature': converted_value}
+                try:
+                    new_battery_temperature: _RowSnapshot = self._insert_row(session, BatteryTemperature, values)
+                    session.commit()
+                    LOG.debug('Added new battery temperature %.2f for vehicle %s to database', converted_value, self.vehicle.vin)
+                    self.last_battery_temperature = new_battery_temperature
+                except IntegrityError as err:
+                    session.rollback()
+                    LOG.error('IntegrityError while adding battery temperature for vehicle %s to database: %s', self.vehicle.vin, err)
+                except DatabaseError as err:
+                    session.rollback()
+                    LOG.error('DatabaseError while adding battery temperature for vehicle %s to database: %s', self.vehicle.vin, err)
+                    self.database_plugin.report_database_error()
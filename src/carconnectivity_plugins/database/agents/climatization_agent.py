@@ -5,9 +5,10 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import logging
+import threading
 
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.orm.exc import ObjectDeletedError
 
 from carconnectivity.observable import Observable
 from carconnectivity.utils.timeout_lock import TimeoutLock
@@ -17,6 +18,7 @@ from carconnectivity_plugins.database.model.climatization_state import Climatiza
 
 if TYPE_CHECKING:
     from typing import Optional
+    from sqlalchemy import Select
     from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm.session import Session
 
@@ -31,6 +33,9 @@ if TYPE_CHECKING:
 
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.climatization_agent")
 
+_LAST_STATE_STATEMENT: Select = select(ClimatizationState).where(ClimatizationState.vin == bindparam('vin')) \
+    .order_by(ClimatizationState.first_date.desc()).limit(1)
+
 
 # pylint: disable=duplicate-code
 # pylint: disable=duplicate-code
@@ -43,11 +48,12 @@ class ClimatizationAgent(BaseAgent):
     last occurrence of each state.
     Attributes:
         database_plugin (Plugin): Reference to the database plugin for health monitoring.
-        session_factory (scoped_session[Session]): SQLAlchemy session factory for database operations.
         vehicle (Vehicle): The database vehicle entity being monitored.
         carconnectivity_vehicle (GenericVehicle): The CarConnectivity vehicle object providing real-time data.
         last_state (Optional[ClimatizationState]): The most recent climatization state record from the database.
         last_state_lock (TimeoutLock): Thread-safe lock for managing concurrent access to state updates.
+        session (Session): Long-lived session of the agent, used through _session_scope().
+        session_lock (threading.RLock): Lock for thread-safe use of the session.
     Raises:
         ValueError: If either vehicle or carconnectivity_vehicle is None during initialization.
     Notes:
@@ -61,38 +67,52 @@ class ClimatizationAgent(BaseAgent):
         if vehicle is None or carconnectivity_vehicle is None:
             raise ValueError("Vehicle or its carconnectivity_vehicle attribute is None")
         self.database_plugin: Plugin = database_plugin
-        self.session_factory: scoped_session[Session] = session_factory
         self.vehicle: Vehicle = vehicle
         self.carconnectivity_vehicle: GenericVehicle = carconnectivity_vehicle
+        # Only the long-lived session is kept, the factory is not needed after creating it
+        self.session: Session = session_factory.session_factory(autoflush=False)
+        self.session_lock: threading.RLock = threading.RLock()
+
+        self.last_state: Optional[ClimatizationState] = None
+        self.last_state_lock: TimeoutLock = TimeoutLock()
 
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            self.last_state: Optional[ClimatizationState] = session.query(ClimatizationState).filter(ClimatizationState.vehicle == self.vehicle)\
-                .order_by(ClimatizationState.first_date.desc()).first()
-            self.last_state_lock: TimeoutLock = TimeoutLock()
+        with self._session_scope(startup=True) as session:
+            self.last_state = self._load_last_state(session)
 
-            self.carconnectivity_vehicle.climatization.state.add_observer(self.__on_state_change, Observable.ObserverEvent.UPDATED)
-            self.__on_state_change(self.carconnectivity_vehicle.climatization.state, Observable.ObserverEvent.UPDATED)
-        self.session_factory.remove()
+        self.carconnectivity_vehicle.climatization.state.add_observer(self.__on_state_change, Observable.ObserverEvent.UPDATED)
+        self.__on_state_change(self.carconnectivity_vehicle.climatization.state, Observable.ObserverEvent.UPDATED)
 
     def __del__(self) -> None:
+        # An agent whose constructor failed before it created its session has not registered anything to clean up
+        if hasattr(self, 'session'):
+            self.close()
+
+    def close(self) -> None:
         self.carconnectivity_vehicle.climatization.state.remove_observer(self.__on_state_change)
+        with self.session_lock:
+            self.session.close()
+
+    def _load_last_state(self, session: Session) -> Optional[ClimatizationState]:
+        """
+        Load the most recent climatization state of the vehicle.
+
+        Args:
+            session (Session): The session to load the climatization state into.
+
+        Returns:
+            Optional[ClimatizationState]: The most recent climatization state or None if there is none for the vehicle.
+        """
+        return session.scalars(_LAST_STATE_STATEMENT, {'vin': self.vehicle.vin}).first()
 
     def __on_state_change(self, element: EnumAttribute[Climatization.ClimatizationState], flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             with self.last_state_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
+                with self._session_scope() as session:
                     if self.last_state is not None:
-                        try:
-                            self.last_state = session.merge(self.last_state)
-                            session.refresh(self.last_state)
-                        except ObjectDeletedError:
-                            self.last_state = session.query(ClimatizationState).filter(ClimatizationState.vehicle == self.vehicle) \
-                                .order_by(ClimatizationState.first_date.desc()).first()
+                        self.last_state = self._get_current(session, self.last_state)
+                        if self.last_state is None:
+                            self.last_state = self._load_last_state(session)
                             if self.last_state is not None:
                                 LOG.info('Last climatization state for vehicle %s was deleted from database, reloaded last climatization state',
                                          self.vehicle.vin)
@@ -115,16 +135,15 @@ class ClimatizationAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while adding climatizationstate for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.database_plugin.report_database_error()
 
                     elif self.last_state is not None and self.last_state.state == element.value and element.last_updated is not None:
                         if self.last_state.last_date is None or element.last_updated > self.last_state.last_date:
                             try:
-                                self.last_state.last_date = element.last_updated
+                                self._update_last_date(session, self.last_state, element.last_updated)
                                 session.commit()
                                 LOG.debug('Updated climatizationstate %s for vehicle %s in database', element.value, self.vehicle.vin)
                             except DatabaseError as err:
                                 session.rollback()
                                 LOG.error('DatabaseError while updating climatizationstate for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                self.database_plugin.report_database_error()
@@ -5,9 +5,10 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import logging
+import threading
 
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.orm.exc import ObjectDeletedError
 
 from carconnectivity.observable import Observable
 from carconnectivity.drive import ElectricDrive, CombustionDrive
@@ -20,7 +21,8 @@ from carconnectivity_plugins.database.model.drive_consumption import DriveConsum
 from carconnectivity_plugins.database.model.drive_range_full import DriveRangeEstimatedFull
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Dict, Optional, Type, TypeVar
+    from sqlalchemy import Select
     from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm.session import Session
 
@@ -29,11 +31,18 @@ if TYPE_CHECKING:
     from carconnectivity.drive import GenericDrive
 
     from carconnectivity_plugins.database.plugin import Plugin
+    from carconnectivity_plugins.database.model.base import Base
     from carconnectivity_plugins.database.model.drive import Drive
 
+    _RowT = TypeVar('_RowT', bound=Base)
+
 
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.drive_state_agent")
 
+_LAST_ROW_STATEMENTS: Dict[Type[Base], Select] = {model: select(model).where(model.drive_id == bindparam('drive_id'))
+                                                  .order_by(model.first_date.desc()).limit(1)
+                                                  for model in (DriveLevel, DriveRange, DriveRangeEstimatedFull, DriveConsumption)}
+
 
 #  pylint: disable=duplicate-code
 # pylint: disable-next=too-many-instance-attributes, too-few-public-methods
@@ -55,6 +64,7 @@ class DriveStateAgent(BaseAgent):
         database_plugin (Plugin): Reference to the database plugin for health status updates.
         session_factory (scoped_session[Session]): SQLAlchemy session factory for database operations.
         drive (Drive): Database model representing the drive being monitored.
+        drive_id (int): Id of the drive, used by the time series handlers without loading the drive.
         drive_lock (TimeoutLock): Lock for thread-safe drive access.
         carconnectivity_drive (GenericDrive): CarConnectivity drive object being observed.
         type_lock (TimeoutLock): Lock for drive type updates.
@@ -72,6 +82,8 @@ class DriveStateAgent(BaseAgent):
         last_range_lock (TimeoutLock): Lock for range updates.
         last_range_estimated_full (Optional[DriveRangeEstimatedFull]): Most recent estimated full range record.
         last_range_estimated_full_lock (TimeoutLock): Lock for estimated full range updates.
+        session (Session): Long-lived session of the agent, used through _session_scope().
+        session_lock (threading.RLock): Lock for thread-safe use of the session.
     Raises:
         ValueError: If drive or carconnectivity_drive is None during initialization.
     """
@@ -82,80 +94,92 @@ class DriveStateAgent(BaseAgent):
         self.drive: Drive = drive
         self.drive_lock: TimeoutLock = TimeoutLock()
         self.carconnectivity_drive: GenericDrive = carconnectivity_drive
+        if self.drive is None or self.carconnectivity_drive is None:
+            raise ValueError("Drive or its carconnectivity_drive attribute is None")
+        # The time series handlers only need the id of the drive, so they do not load the drive row
+        self.drive_id: int = self.drive.id
+        self.session: Session = self.session_factory.session_factory(autoflush=False)
+        self.session_lock: threading.RLock = threading.RLock()
+        self.type_lock: TimeoutLock = TimeoutLock()
+        self.range_wltp_lock: TimeoutLock = TimeoutLock()
+        if isinstance(self.carconnectivity_drive, ElectricDrive):
+            self.total_capacity_lock: TimeoutLock = TimeoutLock()
+            self.available_capacity_lock: TimeoutLock = TimeoutLock()
+            self.last_electric_consumption: Optional[DriveConsumption] = None
+            self.last_electric_consumption_lock: TimeoutLock = TimeoutLock()
+        elif isinstance(self.carconnectivity_drive, CombustionDrive):
+            self.fuel_available_capacity_lock: TimeoutLock = TimeoutLock()
+            self.last_fuel_consumption: Optional[DriveConsumption] = None
+            self.last_fuel_consumption_lock: TimeoutLock = TimeoutLock()
+        self.last_level: Optional[DriveLevel] = None
+        self.last_level_lock: TimeoutLock = TimeoutLock()
+        self.last_range: Optional[DriveRange] = None
+        self.last_range_lock: TimeoutLock = TimeoutLock()
+        self.last_range_estimated_full: Optional[DriveRangeEstimatedFull] = None
+        self.last_range_estimated_full_lock: TimeoutLock = TimeoutLock()
+
         with self.drive_lock:
-            with self.session_factory() as session:
+            with self._session_scope(startup=True) as session:
+                # The drive stays attached to the long-lived session, so the attribute handlers compare against it without reloading it
                 self.drive = session.merge(self.drive)
                 session.refresh(self.drive)
 
-                if self.drive is None or self.carconnectivity_drive is None:
-                    raise ValueError("Drive or its carconnectivity_drive attribute is None")
+                if isinstance(self.carconnectivity_drive, ElectricDrive):
+                    self.last_electric_consumption = self._load_last_row(session, DriveConsumption)
+                elif isinstance(self.carconnectivity_drive, CombustionDrive):
+                    self.last_fuel_consumption = self._load_last_row(session, DriveConsumption)
+                self.last_level = self._load_last_row(session, DriveLevel)
+                self.last_range = self._load_last_row(session, DriveRange)
+                self.last_range_estimated_full = self._load_last_row(session, DriveRangeEstimatedFull)
 
-                self.carconnectivity_drive.type.add_observer(self.__on_type_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-                self.type_lock: TimeoutLock = TimeoutLock()
-                self.__on_type_change(self.carconnectivity_drive.type, Observable.ObserverEvent.VALUE_CHANGED)
+            # The handlers are only called for the current values once the startup scope is committed
+            self.carconnectivity_drive.type.add_observer(self.__on_type_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+            self.__on_type_change(self.carconnectivity_drive.type, Observable.ObserverEvent.VALUE_CHANGED)
 
-                self.carconnectivity_drive.range_wltp.add_observer(self.__on_range_wltp_change, Observable.ObserverEvent.VALUE_CHANGED,
-                                                                   on_transaction_end=True)
-                self.range_wltp_lock: TimeoutLock = TimeoutLock()
-                self.__on_range_wltp_change(self.carconnectivity_drive.range_wltp, Observable.ObserverEvent.VALUE_CHANGED)
+            self.carconnectivity_drive.range_wltp.add_observer(self.__on_range_wltp_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+            self.__on_range_wltp_change(self.carconnectivity_drive.range_wltp, Observable.ObserverEvent.VALUE_CHANGED)
 
-                if isinstance(self.carconnectivity_drive, ElectricDrive):
-                    self.carconnectivity_drive.battery.total_capacity.add_observer(self.__on_electric_total_capacity_change,
+            if isinstance(self.carconnectivity_drive, ElectricDrive):
+                self.carconnectivity_drive.battery.total_capacity.add_observer(self.__on_electric_total_capacity_change,
+                                                                               Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+                self.__on_electric_total_capacity_change(self.carconnectivity_drive.battery.total_capacity, Observable.ObserverEvent.VALUE_CHANGED)
+
+                self.carconnectivity_drive.battery.available_capacity.add_observer(self.__on_electric_available_capacity_change,
                                                                                    Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-                    self.total_capacity_lock: TimeoutLock = TimeoutLock()
-                    self.__on_electric_total_capacity_change(self.carconnectivity_drive.battery.total_capacity, Observable.ObserverEvent.VALUE_CHANGED)
-
-                    self.carconnectivity_drive.battery.available_capacity.add_observer(self.__on_electric_available_capacity_change,
-                                                                                       Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-                    self.available_capacity_lock: TimeoutLock = TimeoutLock()
-                    self.__on_electric_available_capacity_change(self.carconnectivity_drive.battery.available_capacity,
-                                                                 Observable.ObserverEvent.VALUE_CHANGED)
-
-                    self.last_electric_consumption: Optional[DriveConsumption] = session.query(DriveConsumption) \
-                        .filter(DriveConsumption.drive_id == self.drive.id).order_by(DriveConsumption.first_date.desc()).first()
-                    self.last_electric_consumption_lock: TimeoutLock = TimeoutLock()
-                    self.carconnectivity_drive.consumption.add_observer(self.__on_electric_consumption_change,
-                                                                        Observable.ObserverEvent.VALUE_CHANGED)
-                    self.__on_electric_consumption_change(self.carconnectivity_drive.consumption, Observable.ObserverEvent.UPDATED)
+                self.__on_electric_available_capacity_change(self.carconnectivity_drive.battery.available_capacity,
+                                                             Observable.ObserverEvent.VALUE_CHANGED)
 
-                elif isinstance(self.carconnectivity_drive, CombustionDrive):
-                    self.carconnectivity_drive.fuel_tank.available_capacity.add_observer(self.__on_fuel_available_capacity_change,
-                                                                                         Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-                    self.fuel_available_capacity_lock: TimeoutLock = TimeoutLock()
-                    self.__on_fuel_available_capacity_change(self.carconnectivity_drive.fuel_tank.available_capacity, Observable.ObserverEvent.VALUE_CHANGED)
-
-                    self.last_fuel_consumption: Optional[DriveConsumption] = session.query(DriveConsumption) \
-                        .filter(DriveConsumption.drive_id == self.drive.id).order_by(DriveConsumption.first_date.desc()).first()
-                    self.last_fuel_consumption_lock: TimeoutLock = TimeoutLock()
-                    self.carconnectivity_drive.consumption.add_observer(self.__on_fuel_consumption_change,
-                                                                        Observable.ObserverEvent.VALUE_CHANGED)
-                    self.__on_fuel_consumption_change(self.carconnectivity_drive.consumption, Observable.ObserverEvent.UPDATED)
-
-                self.last_level: Optional[DriveLevel] = session.query(DriveLevel).filter(DriveLevel.drive_id == self.drive.id) \
-                    .order_by(DriveLevel.first_date.desc()).first()
-                self.last_level_lock: TimeoutLock = TimeoutLock()
-                self.last_range: Optional[DriveRange] = session.query(DriveRange).filter(DriveRange.drive_id == self.drive.id) \
-                    .order_by(DriveRange.first_date.desc()).first()
-                self.last_range_lock: TimeoutLock = TimeoutLock()
-                self.last_range_estimated_full: Optional[DriveRangeEstimatedFull] = session.query(DriveRangeEstimatedFull) \
-                    .filter(DriveRangeEstimatedFull.drive_id == self.drive.id).order_by(DriveRangeEstimatedFull.first_date.desc()).first()
-                self.last_range_estimated_full_lock: TimeoutLock = TimeoutLock()
-
-                if self.carconnectivity_drive is not None:
-                    self.carconnectivity_drive.level.add_observer(self.__on_level_change, Observable.ObserverEvent.UPDATED)
-                    if self.carconnectivity_drive.level.enabled:
-                        self.__on_level_change(self.carconnectivity_drive.level, Observable.ObserverEvent.UPDATED)
-
-                    self.carconnectivity_drive.range.add_observer(self.__on_range_change, Observable.ObserverEvent.UPDATED)
-                    if self.carconnectivity_drive.range.enabled:
-                        self.__on_range_change(self.carconnectivity_drive.range, Observable.ObserverEvent.UPDATED)
-
-                    self.carconnectivity_drive.range_estimated_full.add_observer(self.__on_range_estimated_full_change, Observable.ObserverEvent.UPDATED)
-                    if self.carconnectivity_drive.range_estimated_full.enabled:
-                        self.__on_range_estimated_full_change(self.carconnectivity_drive.range_estimated_full, Observable.ObserverEvent.UPDATED)
-            session_factory.remove()
+                self.carconnectivity_drive.consumption.add_observer(self.__on_electric_consumption_change,
+                                                                    Observable.ObserverEvent.VALUE_CHANGED)
+                self.__on_electric_consumption_change(self.carconnectivity_drive.consumption, Observable.ObserverEvent.UPDATED)
+
+            elif isinstance(self.carconnectivity_drive, CombustionDrive):
+                self.carconnectivity_drive.fuel_tank.available_capacity.add_observer(self.__on_fuel_available_capacity_change,
+                                                                                     Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+                self.__on_fuel_available_capacity_change(self.carconnectivity_drive.fuel_tank.available_capacity, Observable.ObserverEvent.VALUE_CHANGED)
+
+                self.carconnectivity_drive.consumption.add_observer(self.__on_fuel_consumption_change,
+                                                                    Observable.ObserverEvent.VALUE_CHANGED)
+                self.__on_fuel_consumption_change(self.carconnectivity_drive.consumption, Observable.ObserverEvent.UPDATED)
+
+            self.carconnectivity_drive.level.add_observer(self.__on_level_change, Observable.ObserverEvent.UPDATED)
+            if self.carconnectivity_drive.level.enabled:
+                self.__on_level_change(self.carconnectivity_drive.level, Observable.ObserverEvent.UPDATED)
+
+            self.carconnectivity_drive.range.add_observer(self.__on_range_change, Observable.ObserverEvent.UPDATED)
+            if self.carconnectivity_drive.range.enabled:
+                self.__on_range_change(self.carconnectivity_drive.range, Observable.ObserverEvent.UPDATED)
+
+            self.carconnectivity_drive.range_estimated_full.add_observer(self.__on_range_estimated_full_change, Observable.ObserverEvent.UPDATED)
+            if self.carconnectivity_drive.range_estimated_full.enabled:
+                self.__on_range_estimated_full_change(self.carconnectivity_drive.range_estimated_full, Observable.ObserverEvent.UPDATED)
 
     def __del__(self) -> None:
+        # An agent whose constructor failed before it created its session has not registered anything to clean up
+        if hasattr(self, 'session'):
+            self.close()
+
+    def close(self) -> None:
         self.carconnectivity_drive.type.remove_observer(self.__on_type_change)
         self.carconnectivity_drive.range_wltp.remove_observer(self.__on_range_wltp_change)
 
@@ -171,159 +195,157 @@ class DriveStateAgent(BaseAgent):
         self.carconnectivity_drive.level.remove_observer(self.__on_level_change)
         self.carconnectivity_drive.range.remove_observer(self.__on_range_change)
         self.carconnectivity_drive.range_estimated_full.remove_observer(self.__on_range_estimated_full_change)
+        with self.session_lock:
+            self.session.close()
+
+    def _load_last_row(self, session: Session, model: Type[_RowT]) -> Optional[_RowT]:
+        """
+        Load the most recent row of a time series table for the drive.
+
+        Args:
+            session (Session): The session to load the row into.
+            model (Type[_RowT]): The time series model.
+
+        Returns:
+            Optional[_RowT]: The most recent row or None if there is none for the drive.
+        """
+        return session.scalars(_LAST_ROW_STATEMENTS[model], {'drive_id': self.drive_id}).first()
+
+    def _describe(self) -> str:
+        return f'drive {self.drive_id}'
 
     def __on_level_change(self, element: LevelAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             with self.last_level_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if self.last_level is not None:
-                        try:
-                            self.last_level = session.merge(self.last_level)
-                            session.refresh(self.last_level)
-                        except ObjectDeletedError:
-                            self.last_level = session.query(DriveLevel).filter(DriveLevel.drive_id == self.drive.id) \
-                                .order_by(DriveLevel.first_date.desc()).first()
+                        self.last_level = self._get_current(session, self.last_level)
+                        if self.last_level is None:
+                            self.last_level = self._load_last_row(session, DriveLevel)
                             if self.last_level is not None:
-                                LOG.info('Last level for drive %s was deleted from database, reloaded last level', self.drive.id)
+                                LOG.info('Last level for drive %s was deleted from database, reloaded last level', self.drive_id)
                             else:
-                                LOG.info('Last level for drive %s was deleted from database, no more levels found', self.drive.id)
+                                LOG.info('Last level for drive %s was deleted from database, no more levels found', self.drive_id)
                     if element.last_updated is not None \
                             and (self.last_level is None or (self.last_level.level != element.value
                                                              and element.last_updated > self.last_level.last_date)):
-                        new_level: DriveLevel = DriveLevel(drive_id=self.drive.id, first_date=element.last_updated, last_date=element.last_updated,
+                        new_level: DriveLevel = DriveLevel(drive_id=self.drive_id, first_date=element.last_updated, last_date=element.last_updated,
                                                            level=element.value)
                         try:
                             session.add(new_level)
                             session.commit()
-                            LOG.debug('Added new level %s for drive %s to database', element.value, self.drive.id)
+                            LOG.debug('Added new level %s for drive %s to database', element.value, self.drive_id)
                             self.last_level = new_level
                         except IntegrityError as err:
                             session.rollback()
-                            LOG.error('IntegrityError while adding drive level for drive %s to database: %s', self.drive.id, err)
+                            LOG.error('IntegrityError while adding drive level for drive %s to database: %s', self.drive_id, err)
                         except DatabaseError as err:
                             session.rollback()
-                            LOG.error('DatabaseError while adding level for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            LOG.error('DatabaseError while adding level for drive %s to database: %s', self.drive_id, err)
+                            self.database_plugin.report_database_error()
                     elif self.last_level is not None and self.last_level.level == element.value \
                             and element.last_updated is not None:
                         if self.last_level.last_date is None or element.last_updated > self.last_level.last_date:
                             try:
-                                self.last_level.last_date = element.last_updated
+                                self._update_last_date(session, self.last_level, element.last_updated)
                                 session.commit()
-                                LOG.debug('Updated level %s for drive %s in database', element.value, self.drive.id)
+                                LOG.debug('Updated level %s for drive %s in database', element.value, self.drive_id)
                             except DatabaseError as err:
                                 session.rollback()
-                                LOG.error('DatabaseError while updating level for drive %s in database: %s', self.drive.id, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                LOG.error('DatabaseError while updating level for drive %s in database: %s', self.drive_id, err)
+                                self.database_plugin.report_database_error()
 
     def __on_range_change(self, element: RangeAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.last_range_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if self.last_range is not None:
-                        try:
-                            self.last_range = session.merge(self.last_range)
-                            session.refresh(self.last_range)
-                        except ObjectDeletedError:
-                            self.last_range = session.query(DriveRange).filter(DriveRange.drive_id == self.drive.id) \
-                                .order_by(DriveRange.first_date.desc()).first()
+                        self.last_range = self._get_current(session, self.last_range)
+                        if self.last_range is None:
+                            self.last_range = self._load_last_row(session, DriveRange)
                             if self.last_range is not None:
-                                LOG.info('Last range for drive %s was deleted from database, reloaded last range', self.drive.id)
+                                LOG.info('Last range for drive %s was deleted from database, reloaded last range', self.drive_id)
                             else:
-                                LOG.info('Last range for drive %s was deleted from database, no more ranges found', self.drive.id)
+                                LOG.info('Last range for drive %s was deleted from database, no more ranges found', self.drive_id)
                     if element.last_updated is not None \
                             and (self.last_range is None or (self.last_range.range != converted_value
                                                              and element.last_updated > self.last_range.last_date)):
-                        new_range: DriveRange = DriveRange(drive_id=self.drive.id, first_date=element.last_updated, last_date=element.last_updated,
+                        new_range: DriveRange = DriveRange(drive_id=self.drive_id, first_date=element.last_updated, last_date=element.last_updated,
                                                            range=converted_value)
                         try:
                             session.add(new_range)
                             session.commit()
-                            LOG.debug('Added new range %s for drive %s to database', converted_value, self.drive.id)
+                            LOG.debug('Added new range %s for drive %s to database', converted_value, self.drive_id)
                             self.last_range = new_range
                         except IntegrityError as err:
                             session.rollback()
-                            LOG.error('IntegrityError while adding drive range for drive %s to database: %s', self.drive.id, err)
+                            LOG.error('IntegrityError while adding drive range for drive %s to database: %s', self.drive_id, err)
                         except DatabaseError as err:
                             session.rollback()
-                            LOG.error('DatabaseError while adding range for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            LOG.error('DatabaseError while adding range for drive %s to database: %s', self.drive_id, err)
+                            self.database_plugin.report_database_error()
                     elif self.last_range is not None and self.last_range.range == converted_value \
                             and element.last_updated is not None:
                         if self.last_range.last_date is None or element.last_updated > self.last_range.last_date:
                             try:
-                                self.last_range.last_date = element.last_updated
+                                self._update_last_date(session, self.last_range, element.last_updated)
                                 session.commit()
-                                LOG.debug('Updated range %s for drive %s in database', converted_value, self.drive.id)
+                                LOG.debug('Updated range %s for drive %s in database', converted_value, self.drive_id)
                             except DatabaseError as err:
                                 session.rollback()
-                                LOG.error('DatabaseError while updating range for drive %s in database: %s', self.drive.id, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                LOG.error('DatabaseError while updating range for drive %s in database: %s', self.drive_id, err)
+                                self.database_plugin.report_database_error()
 
     def __on_range_estimated_full_change(self, element: RangeAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.last_range_estimated_full_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if self.last_range_estimated_full is not None:
-                        try:
-                            self.last_range_estimated_full = session.merge(self.last_range_estimated_full)
-                            session.refresh(self.last_range_estimated_full)
-                        except ObjectDeletedError:
-                            self.last_range_estimated_full = session.query(DriveRangeEstimatedFull).filter(DriveRangeEstimatedFull.drive_id == self.drive.id) \
-                                .order_by(DriveRangeEstimatedFull.first_date.desc()).first()
+                        self.last_range_estimated_full = self._get_current(session, self.last_range_estimated_full)
+                        if self.last_range_estimated_full is None:
+                            self.last_range_estimated_full = self._load_last_row(session, DriveRangeEstimatedFull)
                             if self.last_range_estimated_full is not None:
-                                LOG.info('Last range_estimated_full for drive %s was deleted from database, reloaded last range_estimated_full', self.drive.id)
+                                LOG.info('Last range_estimated_full for drive %s was deleted from database, reloaded last range_estimated_full', self.drive_id)
                             else:
-                                LOG.info('Last range_estimated_full for drive %s was deleted from database, no more range_estimated_full found', self.drive.id)
+                                LOG.info('Last range_estimated_full for drive %s was deleted from database, no more range_estimated_full found', self.drive_id)
                     if element.last_updated is not None \
                             and (self.last_range_estimated_full is None or (self.last_range_estimated_full.range_estimated_full != converted_value
                                                                             and element.last_updated > self.last_range_estimated_full.last_date)):
-                        new_range: DriveRangeEstimatedFull = DriveRangeEstimatedFull(drive_id=self.drive.id, first_date=element.last_updated,
+                        new_range: DriveRangeEstimatedFull = DriveRangeEstimatedFull(drive_id=self.drive_id, first_date=element.last_updated,
                                                                                      last_date=element.last_updated, range_estimated_full=converted_value)
                         try:
                             session.add(new_range)
                             session.commit()
-                            LOG.debug('Added new range_estimated_full %s for drive %s to database', converted_value, self.drive.id)
+                            LOG.debug('Added new range_estimated_full %s for drive %s to database', converted_value, self.drive_id)
                             self.last_range_estimated_full = new_range
                         except IntegrityError as err:
                             session.rollback()
-                            LOG.error('IntegrityError while adding drive range for drive %s to database: %s', self.drive.id, err)
+                            LOG.error('IntegrityError while adding drive range for drive %s to database: %s', self.drive_id, err)
                         except DatabaseError as err:
                             session.rollback()
-                            LOG.error('DatabaseError while adding range_estimated_full for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            LOG.error('DatabaseError while adding range_estimated_full for drive %s to database: %s', self.drive_id, err)
+                            self.database_plugin.report_database_error()
                     elif self.last_range_estimated_full is not None and self.last_range_estimated_full.range_estimated_full == converted_value \
                             and element.last_updated is not None:
                         if self.last_range_estimated_full.last_date is None or element.last_updated > self.last_range_estimated_full.last_date:
                             try:
-                                self.last_range_estimated_full.last_date = element.last_updated
+                                self._update_last_date(session, self.last_range_estimated_full, element.last_updated)
                                 session.commit()
-                                LOG.debug('Updated range_estimated_full %s for drive %s in database', converted_value, self.drive.id)
+                                LOG.debug('Updated range_estimated_full %s for drive %s in database', converted_value, self.drive_id)
                             except DatabaseError as err:
                                 session.rollback()
-                                LOG.error('DatabaseError while updating range_estimated_full for drive %s in database: %s', self.drive.id, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                LOG.error('DatabaseError while updating range_estimated_full for drive %s in database: %s', self.drive_id, err)
+                                self.database_plugin.report_database_error()
 
     def __on_type_change(self, element: EnumAttribute[GenericDrive.Type], flags: Observable.ObserverEvent) -> None:
         del flags
         with self.type_lock, self.drive_lock:
-            with self.session_factory() as session:
-                self.drive = session.merge(self.drive)
-                session.refresh(self.drive)
+            with self._session_scope() as session:
                 if element.enabled and element.value is not None and self.drive.type != element.value:
                     try:
                         self.drive.type = element.value
@@ -331,15 +353,12 @@ class DriveStateAgent(BaseAgent):
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while updating type for drive %s to database: %s', self.drive.id, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+                        self.database_plugin.report_database_error()
 
     def __on_electric_total_capacity_change(self, element: EnergyAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         with self.total_capacity_lock, self.drive_lock:
-            with self.session_factory() as session:
-                self.drive = session.merge(self.drive)
-                session.refresh(self.drive)
+            with self._session_scope() as session:
                 if element.enabled and element.value is not None and self.drive.capacity_total != element.value:
                     try:
                         self.drive.capacity_total = element.value
@@ -347,15 +366,12 @@ class DriveStateAgent(BaseAgent):
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while updating total capacity for drive %s to database: %s', self.drive.id, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+                        self.database_plugin.report_database_error()
 
     def __on_electric_available_capacity_change(self, element: EnergyAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         with self.available_capacity_lock, self.drive_lock:
-            with self.session_factory() as session:
-                self.drive = session.merge(self.drive)
-                session.refresh(self.drive)
+            with self._session_scope() as session:
                 if element.enabled and element.value is not None and self.drive.capacity != element.value:
                     try:
                         self.drive.capacity = element.value
@@ -363,17 +379,14 @@ class DriveStateAgent(BaseAgent):
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while updating available capacity for drive %s to database: %s', self.drive.id, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+                        self.database_plugin.report_database_error()
 
     def __on_range_wltp_change(self, element: RangeAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.range_wltp_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if converted_value is not None and self.drive.wltp_range != converted_value:
                         try:
                             self.drive.wltp_range = converted_value
@@ -381,17 +394,14 @@ class DriveStateAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while updating WLTP range for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                            self.database_plugin.report_database_error()
 
     def __on_fuel_available_capacity_change(self, element: VolumeAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.fuel_available_capacity_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if converted_value is not None and self.drive.capacity != converted_value:
                         try:
                             self.drive.capacity = converted_value
@@ -399,102 +409,89 @@ class DriveStateAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while updating available capacity for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                            self.database_plugin.report_database_error()
 
     def __on_electric_consumption_change(self, element: EnergyConsumptionAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.last_electric_consumption_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if self.last_electric_consumption is not None:
-                        try:
-                            self.last_electric_consumption = session.merge(self.last_electric_consumption)
-                            session.refresh(self.last_electric_consumption)
-                        except ObjectDeletedError:
-                            self.last_electric_consumption = session.query(DriveConsumption).filter(DriveConsumption.drive_id == self.drive.id) \
-                                .order_by(DriveConsumption.first_date.desc()).first()
+                        self.last_electric_consumption = self._get_current(session, self.last_electric_consumption)
+                        if self.last_electric_consumption is None:
+                            self.last_electric_consumption = self._load_last_row(session, DriveConsumption)
                             if self.last_electric_consumption is not None:
-                                LOG.info('Last electric consumption for drive %s was deleted from database, reloaded last electric consumption', self.drive.id)
+                                LOG.info('Last electric consumption for drive %s was deleted from database, reloaded last electric consumption', self.drive_id)
                             else:
-                                LOG.info('Last electric consumption for drive %s was deleted from database, no more electric consumptions found', self.drive.id)
+                                LOG.info('Last electric consumption for drive %s was deleted from database, no more electric consumptions found', self.drive_id)
                     if element.last_updated is not None \
                             and (self.last_electric_consumption is None or (self.last_electric_consumption.consumption != converted_value
                                                                             and element.last_updated > self.last_electric_consumption.last_date)):
-                        new_consumption: DriveConsumption = DriveConsumption(drive_id=self.drive.id, first_date=element.last_updated,
+                        new_consumption: DriveConsumption = DriveConsumption(drive_id=self.drive_id, first_date=element.last_updated,
                                                                              last_date=element.last_updated, consumption=converted_value)
                         try:
                             session.add(new_consumption)
                             session.commit()
-                            LOG.debug('Added new consumption %s for drive %s to database', converted_value, self.drive.id)
+                            LOG.debug('Added new consumption %s for drive %s to database', converted_value, self.drive_id)
                             self.last_electric_consumption = new_consumption
                         except IntegrityError as err:
                             session.rollback()
-                            LOG.error('IntegrityError while adding drive consumption for drive %s to database: %s', self.drive.id, err)
+                            LOG.error('IntegrityError while adding drive consumption for drive %s to database: %s', self.drive_id, err)
                         except DatabaseError as err:
                             session.rollback()
-                            LOG.error('DatabaseError while adding consumption for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            LOG.error('DatabaseError while adding consumption for drive %s to database: %s', self.drive_id, err)
+                            self.database_plugin.report_database_error()
                     elif self.last_electric_consumption is not None and self.last_electric_consumption.consumption == converted_value \
                             and element.last_updated is not None:
                         if self.last_electric_consumption.last_date is None or element.last_updated > self.last_electric_consumption.last_date:
                             try:
-                                self.last_electric_consumption.last_date = element.last_updated
+                                self._update_last_date(session, self.last_electric_consumption, element.last_updated)
                                 session.commit()
-                                LOG.debug('Updated consumption %s for drive %s in database', converted_value, self.drive.id)
+                                LOG.debug('Updated consumption %s for drive %s in database', converted_value, self.drive_id)
                             except DatabaseError as err:
                                 session.rollback()
-                                LOG.error('DatabaseError while updating consumption for drive %s in database: %s', self.drive.id, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                LOG.error('DatabaseError while updating consumption for drive %s in database: %s', self.drive_id, err)
+                                self.database_plugin.report_database_error()
 
     def __on_fuel_consumption_change(self, element: FuelConsumptionAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             with self.last_fuel_consumption_lock, self.drive_lock:
-                with self.session_factory() as session:
-                    self.drive = session.merge(self.drive)
-                    session.refresh(self.drive)
+                with self._session_scope() as session:
                     if self.last_fuel_consumption is not None:
-                        try:
-                            self.last_fuel_consumption = session.merge(self.last_fuel_consumption)
-                            session.refresh(self.last_fuel_consumption)
-                        except ObjectDeletedError:
-                            self.last_fuel_consumption = session.query(DriveConsumption).filter(DriveConsumption.drive_id == self.drive.id) \
-                                .order_by(DriveConsumption.first_date.desc()).first()
+                        self.last_fuel_consumption = self._get_current(session, self.last_fuel_consumption)
+                        if self.last_fuel_consumption is None:
+                            self.last_fuel_consumption = self._load_last_row(session, DriveConsumption)
                             if self.last_fuel_consumption is not None:
-                                LOG.info('Last fuel consumption for drive %s was deleted from database, reloaded last fuel consumption', self.drive.id)
+                                LOG.info('Last fuel consumption for drive %s was deleted from database, reloaded last fuel consumption', self.drive_id)
                             else:
-                                LOG.info('Last fuel consumption for drive %s was deleted from database, no more fuel consumptions found', self.drive.id)
+                                LOG.info('Last fuel consumption for drive %s was deleted from database, no more fuel consumptions found', self.drive_id)
                     if element.last_updated is not None \
                             and (self.last_fuel_consumption is None or (self.last_fuel_consumption.consumption != element.value
                                                                         and element.last_updated > self.last_fuel_consumption.last_date)):
-                        new_consumption: DriveConsumption = DriveConsumption(drive_id=self.drive.id, first_date=element.last_updated,
+                        new_consumption: DriveConsumption = DriveConsumption(drive_id=self.drive_id, first_date=element.last_updated,
                                                                              last_date=element.last_updated, consumption=element.value)
                         try:
                             session.add(new_consumption)
                             session.commit()
-                            LOG.debug('Added new consumption %s for drive %s to database', element.value, self.drive.id)
+                            LOG.debug('Added new consumption %s for drive %s to database', element.value, self.drive_id)
                             self.last_fuel_consumption = new_consumption
                         except IntegrityError as err:
                             session.rollback()
-                            LOG.error('IntegrityError while adding drive consumption for drive %s to database: %s', self.drive.id, err)
+                            LOG.error('IntegrityError while adding drive consumption for drive %s to database: %s', self.drive_id, err)
                         except DatabaseError as err:
                             session.rollback()
-                            LOG.error('DatabaseError while adding consumption for drive %s to database: %s', self.drive.id, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            LOG.error('DatabaseError while adding consumption for drive %s to database: %s', self.drive_id, err)
+                            self.database_plugin.report_database_error()
                     elif self.last_fuel_consumption is not None and self.last_fuel_consumption.consumption == element.value \
                             and element.last_updated is not None:
                         if self.last_fuel_consumption.last_date is None or element.last_updated > self.last_fuel_consumption.last_date:
                             try:
-                                self.last_fuel_consumption.last_date = element.last_updated
+                                self._update_last_date(session, self.last_fuel_consumption, element.last_updated)
                                 session.commit()
-                                LOG.debug('Updated consumption %s for drive %s in database', element.value, self.drive.id)
+                                LOG.debug('Updated consumption %s for drive %s in database', element.value, self.drive_id)
                             except DatabaseError as err:
                                 session.rollback()
-                                LOG.error('DatabaseError while updating consumption for drive %s in database: %s', self.drive.id, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                LOG.error('DatabaseError while updating consumption for drive %s in database: %s', self.drive_id, err)
+                                self.database_plugin.report_database_error()
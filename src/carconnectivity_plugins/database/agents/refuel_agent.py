@@ -82,6 +82,9 @@ class RefuelAgent(BaseAgent):
         self.carconnectivity_vehicle.position.longitude.add_observer(self.__on_longitude_change, Observable.ObserverEvent.UPDATED)
 
     def __del__(self) -> None:
+        self.close()
+
+    def close(self) -> None:
         self.carconnectivity_drive.level.remove_observer(self.__on_level_change)
         self.carconnectivity_vehicle.position.longitude.remove_observer(self.__on_longitude_change)
 
@@ -106,7 +109,7 @@ class RefuelAgent(BaseAgent):
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while adding refuel session for vehicle %s to database: %s', self.carconnectivity_vehicle.vin.value, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        self.database_plugin.report_database_error()
                 self.session_factory.remove()
             self.last_level = element.value
 
@@ -128,7 +131,7 @@ class RefuelAgent(BaseAgent):
                     session.rollback()
                     LOG.error('DatabaseError while updating odometer for refuel session of vehicle %s in database: %s',
                               self.carconnectivity_vehicle.vin.value, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                    self.database_plugin.report_database_error()
 
     def _update_session_position(self, session: Session, refuel_session: RefuelSession) -> None:
         if self.carconnectivity_vehicle is None:
@@ -142,8 +145,8 @@ class RefuelAgent(BaseAgent):
                     session.rollback()
                     LOG.error('DatabaseError while updating position for refuel session of vehicle %s in database: %s',
                               self.carconnectivity_vehicle.vin.value, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            if refuel_session.location is None and self.carconnectivity_vehicle.position.enabled \
+                    self.database_plugin.report_database_error()
+            if refuel_session.location_uid is None and self.carconnectivity_vehicle.position.enabled \
                     and refuel_session.session_position_latitude is not None and refuel_session.session_position_longitude is not None:
                 location_services: Optional[list[BaseService]] = self.database_plugin.car_connectivity.get_services_for(ServiceType.LOCATION_GAS_STATION)
                 if location_services is None or len(location_services) == 0:
@@ -164,10 +167,9 @@ class RefuelAgent(BaseAgent):
                               refuel_session.session_position_longitude)
                     location: Location = Location.from_carconnectivity_location(location=location_result)
                     try:
-                        location = session.merge(location)
-                        refuel_session.location = location
+                        refuel_session.location_uid = self._upsert_by_uid(session, location)
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while merging location for refuel session of vehicle %s in database: %s',
                                   self.carconnectivity_vehicle.vin.value, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        self.database_plugin.report_database_error()
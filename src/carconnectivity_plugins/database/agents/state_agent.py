@@ -5,9 +5,10 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import logging
+import threading
 
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.orm.exc import ObjectDeletedError
 
 from carconnectivity.observable import Observable
 from carconnectivity.utils.timeout_lock import TimeoutLock
@@ -18,7 +19,8 @@ from carconnectivity_plugins.database.model.connection_state import ConnectionSt
 from carconnectivity_plugins.database.model.outside_temperature import OutsideTemperature
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Dict, Optional, Type, TypeVar
+    from sqlalchemy import Select
     from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm.session import Session
 
@@ -27,11 +29,17 @@ if TYPE_CHECKING:
     from carconnectivity.vehicle import GenericVehicle
 
     from carconnectivity_plugins.database.plugin import Plugin
+    from carconnectivity_plugins.database.model.base import Base
     from carconnectivity_plugins.database.model.vehicle import Vehicle
 
+    _RowT = TypeVar('_RowT', bound=Base)
+
 
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.state_agent")
 
+_LAST_ROW_STATEMENTS: Dict[Type[Base], Select] = {model: select(model).where(model.vin == bindparam('vin')).order_by(model.first_date.desc()).limit(1)
+                                                  for model in (State, ConnectionState, OutsideTemperature)}
+
 
 #  pylint: disable=duplicate-code
 # pylint: disable-next=too-many-instance-attributes, too-few-public-methods
@@ -55,41 +63,47 @@ class StateAgent(BaseAgent):
         self.session_factory: scoped_session[Session] = session_factory
         self.vehicle: Vehicle = vehicle
         self.carconnectivity_vehicle: GenericVehicle = carconnectivity_vehicle
-
-        with self.session_factory() as session:
+        self.session: Session = self.session_factory.session_factory(autoflush=False)
+        self.session_lock: threading.RLock = threading.RLock()
+
+        self.last_state: Optional[State] = None
+        self.last_state_lock: TimeoutLock = TimeoutLock()
+        self.last_connection_state: Optional[ConnectionState] = None
+        self.last_connection_state_lock: TimeoutLock = TimeoutLock()
+        self.last_outside_temperature: Optional[OutsideTemperature] = None
+        self.last_outside_temperature_lock: TimeoutLock = TimeoutLock()
+
+        with self._session_scope(startup=True) as session:
+            # The vehicle stays attached to the long-lived session, so the attribute handlers compare against it without reloading it
             self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            self.last_state: Optional[State] = session.query(State).filter(State.vehicle == self.vehicle).order_by(State.first_date.desc()).first()
-            self.last_state_lock: TimeoutLock = TimeoutLock()
-
-            self.last_connection_state: Optional[ConnectionState] = session.query(ConnectionState).filter(ConnectionState.vehicle == self.vehicle) \
-                .order_by(ConnectionState.first_date.desc()).first()
-            self.last_connection_state_lock: TimeoutLock = TimeoutLock()
-
-            self.last_outside_temperature: Optional[OutsideTemperature] = session.query(OutsideTemperature).filter(OutsideTemperature.vehicle == self.vehicle) \
-                .order_by(OutsideTemperature.first_date.desc()).first()
-            self.last_outside_temperature_lock: TimeoutLock = TimeoutLock()
+            self.last_state = self._load_last_row(session, State)
+            self.last_connection_state = self._load_last_row(session, ConnectionState)
+            self.last_outside_temperature = self._load_last_row(session, OutsideTemperature)
 
-            self.carconnectivity_vehicle.state.add_observer(self.__on_state_change, Observable.ObserverEvent.UPDATED)
-            self.__on_state_change(self.carconnectivity_vehicle.state, Observable.ObserverEvent.UPDATED)
+        self.carconnectivity_vehicle.state.add_observer(self.__on_state_change, Observable.ObserverEvent.UPDATED)
+        self.__on_state_change(self.carconnectivity_vehicle.state, Observable.ObserverEvent.UPDATED)
 
-            self.carconnectivity_vehicle.connection_state.add_observer(self.__on_connection_state_change, Observable.ObserverEvent.UPDATED)
-            self.__on_connection_state_change(self.carconnectivity_vehicle.connection_state, Observable.ObserverEvent.UPDATED)
+        self.carconnectivity_vehicle.connection_state.add_observer(self.__on_connection_state_change, Observable.ObserverEvent.UPDATED)
+        self.__on_connection_state_change(self.carconnectivity_vehicle.connection_state, Observable.ObserverEvent.UPDATED)
 
-            self.carconnectivity_vehicle.outside_temperature.add_observer(self.__on_outside_temperature_change, Observable.ObserverEvent.UPDATED)
-            self.__on_outside_temperature_change(self.carconnectivity_vehicle.outside_temperature, Observable.ObserverEvent.UPDATED)
+        self.carconnectivity_vehicle.outside_temperature.add_observer(self.__on_outside_temperature_change, Observable.ObserverEvent.UPDATED)
+        self.__on_outside_temperature_change(self.carconnectivity_vehicle.outside_temperature, Observable.ObserverEvent.UPDATED)
 
-            self.carconnectivity_vehicle.name.add_observer(self.__on_name_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-            self.carconnectivity_vehicle.manufacturer.add_observer(self.__on_manufacturer_change, Observable.ObserverEvent.VALUE_CHANGED,
-                                                                   on_transaction_end=True)
-            self.carconnectivity_vehicle.model.add_observer(self.__on_model_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-            self.carconnectivity_vehicle.model_year.add_observer(self.__on_model_year_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-            self.carconnectivity_vehicle.type.add_observer(self.__on_type_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
-            self.carconnectivity_vehicle.license_plate.add_observer(self.__on_license_plate_change, Observable.ObserverEvent.VALUE_CHANGED,
-                                                                    on_transaction_end=True)
-        self.session_factory.remove()
+        self.carconnectivity_vehicle.name.add_observer(self.__on_name_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+        self.carconnectivity_vehicle.manufacturer.add_observer(self.__on_manufacturer_change, Observable.ObserverEvent.VALUE_CHANGED,
+                                                               on_transaction_end=True)
+        self.carconnectivity_vehicle.model.add_observer(self.__on_model_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+        self.carconnectivity_vehicle.model_year.add_observer(self.__on_model_year_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+        self.carconnectivity_vehicle.type.add_observer(self.__on_type_change, Observable.ObserverEvent.VALUE_CHANGED, on_transaction_end=True)
+        self.carconnectivity_vehicle.license_plate.add_observer(self.__on_license_plate_change, Observable.ObserverEvent.VALUE_CHANGED,
+                                                                on_transaction_end=True)
 
     def __del__(self) -> None:
+        # An agent whose constructor failed before it created its session has not registered anything to clean up
+        if hasattr(self, 'session'):
+            self.close()
+
+    def close(self) -> None:
         self.carconnectivity_vehicle.state.remove_observer(self.__on_state_change)
         self.carconnectivity_vehicle.connection_state.remove_observer(self.__on_connection_state_change)
         self.carconnectivity_vehicle.outside_temperature.remove_observer(self.__on_outside_temperature_change)
@@ -99,21 +113,31 @@ class StateAgent(BaseAgent):
         self.carconnectivity_vehicle.model_year.remove_observer(self.__on_model_year_change)
         self.carconnectivity_vehicle.type.remove_observer(self.__on_type_change)
         self.carconnectivity_vehicle.license_plate.remove_observer(self.__on_license_plate_change)
+        with self.session_lock:
+            self.session.close()
+
+    def _load_last_row(self, session: Session, model: Type[_RowT]) -> Optional[_RowT]:
+        """
+        Load the most recent row of a time series table for the vehicle.
+
+        Args:
+            session (Session): The session to load the row into.
+            model (Type[_RowT]): The time series model.
+
+        Returns:
+            Optional[_RowT]: The most recent row or None if there is none for the vehicle.
+        """
+        return session.scalars(_LAST_ROW_STATEMENTS[model], {'vin': self.vehicle.vin}).first()
 
     def __on_state_change(self, element: EnumAttribute[GenericVehicle.State], flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             with self.last_state_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
+                with self._session_scope() as session:
                     if self.last_state is not None:
-                        try:
-                            self.last_state = session.merge(self.last_state)
-                            session.refresh(self.last_state)
-                        except ObjectDeletedError:
-                            self.last_state = session.query(State).filter(State.vehicle == self.vehicle) \
-                                .order_by(State.first_date.desc()).first()
+                        self.last_state = self._get_current(session, self.last_state)
+                        if self.last_state is None:
+                            self.last_state = self._load_last_row(session, State)
                             if self.last_state is not None:
                                 LOG.info('Last state for vehicle %s was deleted from database, reloaded last state', self.vehicle.vin)
                             else:
@@ -133,34 +157,28 @@ class StateAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while adding state for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.database_plugin.report_database_error()
 
                     elif self.last_state is not None and self.last_state.state == element.value and element.last_updated is not None:
                         if self.last_state.last_date is None or element.last_updated > self.last_state.last_date:
                             try:
-                                self.last_state.last_date = element.last_updated
+                                self._update_last_date(session, self.last_state, element.last_updated)
                                 session.commit()
                                 LOG.debug('Updated state %s for vehicle %s in database', element.value, self.vehicle.vin)
                             except DatabaseError as err:
                                 session.rollback()
                                 LOG.error('DatabaseError while updating state for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                self.database_plugin.report_database_error()
 
     def __on_connection_state_change(self, element: EnumAttribute[GenericVehicle.ConnectionState], flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             with self.last_connection_state_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
+                with self._session_scope() as session:
                     if self.last_connection_state is not None:
-                        try:
-                            self.last_connection_state = session.merge(self.last_connection_state)
-                            session.refresh(self.last_connection_state)
-                        except ObjectDeletedError:
-                            self.last_connection_state = session.query(ConnectionState).filter(ConnectionState.vehicle == self.vehicle) \
-                                .order_by(ConnectionState.first_date.desc()).first()
+                        self.last_connection_state = self._get_current(session, self.last_connection_state)
+                        if self.last_connection_state is None:
+                            self.last_connection_state = self._load_last_row(session, ConnectionState)
                             if self.last_connection_state is not None:
                                 LOG.info('Last connection state for vehicle %s was deleted from database, reloaded last connection state', self.vehicle.vin)
                             else:
@@ -181,35 +199,29 @@ class StateAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while adding connection state for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.database_plugin.report_database_error()
                     elif self.last_connection_state is not None and self.last_connection_state.connection_state == element.value \
                             and element.last_updated is not None:
                         if self.last_connection_state.last_date is None or element.last_updated > self.last_connection_state.last_date:
                             try:
-                                self.last_connection_state.last_date = element.last_updated
+                                self._update_last_date(session, self.last_connection_state, element.last_updated)
                                 session.commit()
                                 LOG.debug('Updated connection state %s for vehicle %s in database', element.value, self.vehicle.vin)
                             except DatabaseError as err:
                                 session.rollback()
                                 LOG.error('DatabaseError while updating connection state for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                self.database_plugin.report_database_error()
 
     def __on_outside_temperature_change(self, element: TemperatureAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
         if element.enabled:
             converted_value: Optional[float] = element.in_locale(locale=self.database_plugin.locale)[0]
             with self.last_outside_temperature_lock:
-                with self.session_factory() as session:
-                    self.vehicle = session.merge(self.vehicle)
-                    session.refresh(self.vehicle)
+                with self._session_scope() as session:
                     if self.last_outside_temperature is not None:
-                        try:
-                            self.last_outside_temperature = session.merge(self.last_outside_temperature)
-                            session.refresh(self.last_outside_temperature)
-                        except ObjectDeletedError:
-                            self.last_outside_temperature = session.query(OutsideTemperature).filter(OutsideTemperature.vehicle == self.vehicle) \
-                                .order_by(OutsideTemperature.first_date.desc()).first()
+                        self.last_outside_temperature = self._get_current(session, self.last_outside_temperature)
+                        if self.last_outside_temperature is None:
+                            self.last_outside_temperature = self._load_last_row(session, OutsideTemperature)
                             if self.last_outside_temperature is not None:
                                 LOG.info('Last outside temperature for vehicle %s was deleted from database, reloaded last outside temperature',
                                          self.vehicle.vin)
@@ -232,70 +244,51 @@ class StateAgent(BaseAgent):
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while adding outside temperature for vehicle %s to database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.database_plugin.report_database_error()
                     elif self.last_outside_temperature is not None and self.last_outside_temperature.outside_temperature == converted_value \
                             and element.last_updated is not None:
                         if self.last_outside_temperature.last_date is None or element.last_updated > self.last_outside_temperature.last_date:
                             try:
-                                self.last_outside_temperature.last_date = element.last_updated
+                                self._update_last_date(session, self.last_outside_temperature, element.last_updated)
                                 session.commit()
                                 LOG.debug('Updated outside temperature %.2f for vehicle %s in database', converted_value, self.vehicle.vin)
                             except DatabaseError as err:
                                 session.rollback()
                                 LOG.error('DatabaseError while updating outside temperature for vehicle %s in database: %s', self.vehicle.vin, err)
-                                self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                self.session_factory.remove()
+                                self.database_plugin.report_database_error()
 
     def __on_name_change(self, element: StringAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if self.vehicle.name != element.value:
                 self.vehicle.name = element.value
-        self.session_factory.remove()
 
     def __on_manufacturer_change(self, element: StringAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if self.vehicle.manufacturer != element.value:
                 self.vehicle.manufacturer = element.value
-        self.session_factory.remove()
 
     def __on_model_change(self, element: StringAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if self.vehicle.model != element.value:
                 self.vehicle.model = element.value
-        self.session_factory.remove()
 
     def __on_model_year_change(self, element: IntegerAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if self.vehicle.model_year != element.value:
                 self.vehicle.model_year = element.value
-        self.session_factory.remove()
 
     def __on_type_change(self, element: EnumAttribute[GenericVehicle.Type], flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if element.value is not None and self.vehicle.type != element.value:
                 self.vehicle.type = element.value
-        self.session_factory.remove()
 
     def __on_license_plate_change(self, element: StringAttribute, flags: Observable.ObserverEvent) -> None:
         del flags
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
+        with self._session_scope():
             if self.vehicle.license_plate != element.value:
                 self.vehicle.license_plate = element.value
-        self.session_factory.remove()
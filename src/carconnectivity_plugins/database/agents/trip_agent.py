@@ -5,11 +5,12 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import logging
+import threading
 from datetime import datetime, timezone, timedelta
 
 from carconnectivity.objects import GenericObject
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.orm.exc import ObjectDeletedError
 
 from carconnectivity.observable import Observable
 from carconnectivity.vehicle import GenericVehicle
@@ -22,6 +23,7 @@ from carconnectivity_plugins.database.model.location import Location
 
 if TYPE_CHECKING:
     from typing import Optional
+    from sqlalchemy import Select
     from sqlalchemy.orm import scoped_session
     from sqlalchemy.orm.session import Session
 
@@ -32,6 +34,10 @@ if TYPE_CHECKING:
 
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database.agents.trip_agent")
 
+_LAST_TRIP_STATEMENT: Select = select(Trip).where(Trip.vin == bindparam('vin')).order_by(Trip.start_date.desc()).limit(1)
+# How long after the end of a trip a parked position or location is still accepted as its destination
+_DESTINATION_POSITION_DELAY: timedelta = timedelta(minutes=5)
+
 
 #  pylint: disable=duplicate-code
 # pylint: disable-next=too-many-instance-attributes, too-few-public-methods
@@ -42,7 +48,8 @@ class TripAgent(BaseAgent):
     creates and manages trip records in the database. It tracks trip start/end times and
     odometer readings.
     Attributes:
-        session (Session): SQLAlchemy database session for persisting trip data.
+        session (Session): Long-lived SQLAlchemy session for persisting trip data, used through _session_scope().
+        session_lock (threading.RLock): Lock for thread-safe use of the session.
         vehicle (Vehicle): The vehicle being monitored for trip tracking.
         last_carconnectivity_state (Optional[GenericVehicle.State]): The last known state
             of the vehicle to detect state transitions.
@@ -70,16 +77,17 @@ class TripAgent(BaseAgent):
         self.last_parked_position_longitude: Optional[float] = None
         self.last_parked_position_time: Optional[datetime] = None
         self.last_parked_location: Optional[Location] = None
+        self.session: Session = self.session_factory.session_factory(autoflush=False)
+        self.session_lock: threading.RLock = threading.RLock()
+
+        self.trip: Optional[Trip] = None
+        self.trip_lock: TimeoutLock = TimeoutLock()
 
-        with self.session_factory() as session:
-            self.vehicle = session.merge(self.vehicle)
-            session.refresh(self.vehicle)
-            self.trip: Optional[Trip] = session.query(Trip).filter(Trip.vehicle == self.vehicle).order_by(Trip.start_date.desc()).first()
-            self.trip_lock: TimeoutLock = TimeoutLock()
+        with self._session_scope(startup=True) as session:
+            self.trip = self._load_last_trip(session)
             if self.trip is not None:
                 if self.trip.destination_date is None:
                     LOG.info("Last trip for vehicle %s is still open during startup, closing it now", self.vehicle.vin)
-        self.session_factory.remove()
 
         self.carconnectivity_vehicle.state.add_observer(self.__on_state_change, Observable.ObserverEvent.UPDATED, on_transaction_end=True)
         self.__on_state_change(self.carconnectivity_vehicle.state, Observable.ObserverEvent.UPDATED)
@@ -97,10 +105,29 @@ class TripAgent(BaseAgent):
         self._on_position_location_change(self.carconnectivity_vehicle.position.location.uid, Observable.ObserverEvent.UPDATED)
 
     def __del__(self) -> None:
+        # An agent whose constructor failed before it created its session has not registered anything to clean up
+        if hasattr(self, 'session'):
+            self.close()
+
+    def close(self) -> None:
         self.carconnectivity_vehicle.state.remove_observer(self.__on_state_change)
         self.carconnectivity_vehicle.position.latitude.remove_observer(self._on_position_latitude_change)
         self.carconnectivity_vehicle.position.longitude.remove_observer(self._on_position_longitude_change)
         self.carconnectivity_vehicle.position.location.uid.remove_observer(self._on_position_location_change)
+        with self.session_lock:
+            self.session.close()
+
+    def _load_last_trip(self, session: Session) -> Optional[Trip]:
+        """
+        Load the most recent trip of the vehicle.
+
+        Args:
+            session (Session): The session to load the trip into.
+
+        Returns:
+            Optional[Trip]: The most recent trip or None if there is no trip for the vehicle.
+        """
+        return session.scalars(_LAST_TRIP_STATEMENT, {'vin': self.vehicle.vin}).first()
 
     # pylint: disable-next=too-many-branches,too-many-statements
     def __on_state_change(self, element: EnumAttribute[GenericVehicle.State], flags: Observable.ObserverEvent) -> None:
@@ -110,17 +137,12 @@ class TripAgent(BaseAgent):
                 raise ValueError("Vehicle's carconnectivity_vehicle attribute is None")
             if element.enabled and element.value is not None:
                 if self.last_carconnectivity_state is not None:
-                    with self.session_factory() as session:
-                        self.vehicle = session.merge(self.vehicle)
-                        session.refresh(self.vehicle)
+                    with self._session_scope() as session:
                         with self.trip_lock:
                             if self.trip is not None:
-                                try:
-                                    self.trip = session.merge(self.trip)
-                                    session.refresh(self.trip)
-                                except ObjectDeletedError:
-                                    self.trip = session.query(Trip).filter(Trip.vehicle == self.vehicle) \
-                                        .order_by(Trip.start_date.desc()).first()
+                                self.trip = self._get_current(session, self.trip)
+                                if self.trip is None:
+                                    self.trip = self._load_last_trip(session)
                                     if self.trip is not None:
                                         LOG.info('Last trip for vehicle %s was deleted from database, reloaded last trip', self.vehicle.vin)
                                     else:
@@ -155,7 +177,7 @@ class TripAgent(BaseAgent):
                                 except DatabaseError as err:
                                     session.rollback()
                                     LOG.error('DatabaseError while adding trip for vehicle %s to database: %s', self.vehicle.vin, err)
-                                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                                    self.database_plugin.report_database_error()
                             elif (self.last_carconnectivity_state == GenericVehicle.State.IGNITION_ON
                                     and element.value not in (GenericVehicle.State.IGNITION_ON, GenericVehicle.State.DRIVING)) \
                                     or (self.last_carconnectivity_state == GenericVehicle.State.DRIVING
@@ -175,8 +197,7 @@ class TripAgent(BaseAgent):
                                     except DatabaseError as err:
                                         session.rollback()
                                         LOG.error('DatabaseError while ending trip for vehicle %s in database: %s', self.vehicle.vin, err)
-                                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-                    self.session_factory.remove()
+                                        self.database_plugin.report_database_error()
                 self.last_carconnectivity_state = element.value
 
     def _on_position_latitude_change(self, element: FloatAttribute, flags: Observable.ObserverEvent) -> None:
@@ -204,59 +225,46 @@ class TripAgent(BaseAgent):
     def _on_position_change(self) -> None:
         # Check if there is a finished trip that lacks destination position. We allow 5min after destination_date to set the position.
         if self.trip is not None:
-            with self.session_factory() as session:
-                self.vehicle = session.merge(self.vehicle)
-                session.refresh(self.vehicle)
+            with self._session_scope() as session:
                 with self.trip_lock:
-                    try:
-                        self.trip = session.merge(self.trip)
-                        session.refresh(self.trip)
-                    except ObjectDeletedError:
-                        self.trip = session.query(Trip).filter(Trip.vehicle == self.vehicle) \
-                            .order_by(Trip.start_date.desc()).first()
+                    self.trip = self._get_current(session, self.trip)
+                    if self.trip is None:
+                        self.trip = self._load_last_trip(session)
                         if self.trip is not None:
                             LOG.info('Last trip for vehicle %s was deleted from database, reloaded last trip', self.vehicle.vin)
                         else:
                             LOG.info('Last trip for vehicle %s was deleted from database, no more trips found', self.vehicle.vin)
                     if self.trip is not None and self.trip.destination_date is not None and self.trip.destination_position_latitude is None \
                             and self.last_parked_position_time is not None \
-                            and self.last_parked_position_time < (self.trip.destination_date + timedelta(minutes=5)):
+                            and self.last_parked_position_time < (self.trip.destination_date + _DESTINATION_POSITION_DELAY):
                         self._update_trip_position(session, self.trip, start=False,
                                                    latitude=self.last_parked_position_latitude,
                                                    longitude=self.last_parked_position_longitude,
                                                    location=self.last_parked_location)
-            self.session_factory.remove()
 
     def _on_location_change(self) -> None:
         # Check if there is a finished trip that lacks destination location. We allow 5min after destination_date to set the position.
         if self.trip is not None and self.last_parked_location is not None:
-            with self.session_factory() as session:
-                self.vehicle = session.merge(self.vehicle)
-                session.refresh(self.vehicle)
+            with self._session_scope() as session:
                 with self.trip_lock:
-                    try:
-                        self.trip = session.merge(self.trip)
-                        session.refresh(self.trip)
-                    except ObjectDeletedError:
-                        self.trip = session.query(Trip).filter(Trip.vehicle == self.vehicle) \
-                            .order_by(Trip.start_date.desc()).first()
+                    self.trip = self._get_current(session, self.trip)
+                    if self.trip is None:
+                        self.trip = self._load_last_trip(session)
                         if self.trip is not None:
                             LOG.info('Last trip for vehicle %s was deleted from database, reloaded last trip', self.vehicle.vin)
                         else:
                             LOG.info('Last trip for vehicle %s was deleted from database, no more trips found', self.vehicle.vin)
-                    if self.trip is not None and self.trip.destination_date is not None and self.trip.destination_location is None \
+                    if self.trip is not None and self.trip.destination_date is not None and self.trip.destination_location_uid is None \
                             and self.last_parked_position_time is not None \
-                            and self.last_parked_position_time < (self.trip.destination_date + timedelta(minutes=5)):
+                            and self.last_parked_position_time < (self.trip.destination_date + _DESTINATION_POSITION_DELAY):
                         location: Location = self.last_parked_location
                         try:
-                            location = session.merge(location)
-                            self.trip.destination_location = location
+                            self.trip.destination_location_uid = self._upsert_by_uid(session, location)
                             session.commit()
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while merging location for trip of vehicle %s in database: %s', self.vehicle.vin, err)
-                            self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
-            self.session_factory.remove()
+                            self.database_plugin.report_database_error()
 
     # pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-branches
     def _update_trip_position(self, session: Session, trip: Trip, start: bool,
@@ -280,19 +288,18 @@ class TripAgent(BaseAgent):
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while updating position for trip of vehicle %s in database: %s', self.vehicle.vin, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        self.database_plugin.report_database_error()
                 if location is None:
-                    if trip.start_location is None and self.carconnectivity_vehicle.position.location.enabled:
+                    if trip.start_location_uid is None and self.carconnectivity_vehicle.position.location.enabled:
                         location = Location.from_carconnectivity_location(location=self.carconnectivity_vehicle.position.location)
                 if location is not None:
                     try:
-                        location = session.merge(location)
-                        trip.start_location = location
+                        trip.start_location_uid = self._upsert_by_uid(session, location)
                         session.commit()
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while merging location for trip of vehicle %s in database: %s', self.vehicle.vin, err)
-                        self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        self.database_plugin.report_database_error()
                 return True
             if trip.destination_position_latitude is None and trip.destination_position_longitude is None:
                 try:
@@ -302,18 +309,17 @@ class TripAgent(BaseAgent):
                 except DatabaseError as err:
                     session.rollback()
                     LOG.error('DatabaseError while updating position for trip of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                    self.database_plugin.report_database_error()
             if location is None:
-                if trip.destination_location is None and self.carconnectivity_vehicle.position.location.enabled:
+                if trip.destination_location_uid is None and self.carconnectivity_vehicle.position.location.enabled:
                     location = Location.from_carconnectivity_location(location=self.carconnectivity_vehicle.position.location)
             if location is not None:
                 try:
-                    location = session.merge(location)
-                    trip.destination_location = location
+                    trip.destination_location_uid = self._upsert_by_uid(session, location)
                     session.commit()
                 except DatabaseError as err:
                     session.rollback()
                     LOG.error('DatabaseError while merging location for trip of vehicle %s in database: %s', self.vehicle.vin, err)
-                    self.database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                    self.database_plugin.report_database_error()
             return True
         return False
@@ -5,6 +5,8 @@ Revises: ${down_revision | comma,n}
 Create Date: ${create_date}
 
 """
+# Alembic looks up the revision identifiers by these names and provides the operations of op only at runtime
+# pylint: disable=invalid-name,no-member
 from alembic import op
 import sqlalchemy as sa
 ${imports if imports else ""}
@@ -17,8 +19,10 @@ depends_on = ${repr(depends_on)}
 
 
 def upgrade():
+    """Upgrade the schema to this revision."""
     ${upgrades if upgrades else "pass"}
 
 
 def downgrade():
+    """Downgrade the schema to the previous revision."""
     ${downgrades if downgrades else "pass"}
@@ -0,0 +1,31 @@
+"""add index for the lookup of the latest charging session
+
+Revision ID: a3c5e8f1b2d4
+Revises:
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+# Alembic looks up the revision identifiers by these names and provides the operations of op only at runtime
+# pylint: disable=invalid-name,no-member
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e8f1b2d4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the index used to find the latest charging session of a vehicle."""
+    # create_all() may already have created the index together with the table
+    if 'charging_sessions_vin_latest' not in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('charging_sessions')}:
+        op.create_index('charging_sessions_vin_latest', 'charging_sessions',
+                        ['vin', 'session_start_date', 'plug_locked_date', 'plug_connected_date'])
+
+
+def downgrade():
+    """Remove the index used to find the latest charging session of a vehicle."""
+    op.drop_index('charging_sessions_vin_latest', table_name='charging_sessions')
@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING, Optional
 
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Table, Column, UniqueConstraint
+from sqlalchemy import ForeignKey, Table, Column, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship, backref
 
 from sqlalchemy_utc import UtcDateTime
@@ -55,7 +55,10 @@ class ChargingSession(Base):  # pylint: disable=too-few-public-methods,too-many-
     """
 
     __tablename__: str = 'charging_sessions'
-    __table_args__: tuple[Constraint] = (UniqueConstraint("vin", "session_start_date", name="vin_session_start_date"),)
+    # The index serves the lookup of the latest session ordered by session start, plug locked and plug connected date
+    __table_args__: tuple[Constraint, Index] = (UniqueConstraint("vin", "session_start_date", name="vin_session_start_date"),
+                                                Index("charging_sessions_vin_latest", "vin", "session_start_date", "plug_locked_date",
+                                                      "plug_connected_date"))
 
     id: Mapped[int] = mapped_column(primary_key=True)
     vin: Mapped[str] = mapped_column(ForeignKey("vehicles.vin"))
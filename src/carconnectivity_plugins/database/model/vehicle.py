@@ -112,6 +112,7 @@ class Vehicle(Base):
                 self.license_plate = carconnectivity_vehicle.license_plate.value
             session.commit()
 
+            drive_agents: list[BaseAgent] = []
             for drive_id, drive in carconnectivity_vehicle.drives.drives.items():
                 drive_db: Optional[Drive] = session.query(Drive).filter(Drive.vin == vin, Drive.drive_id == drive_id).first()
                 if drive_db is None:
@@ -121,17 +122,19 @@ class Vehicle(Base):
                         session.commit()
                         LOG.debug('Added new drive %s for vehicle %s to database', drive_id, vin)
                         drive_db.connect(database_plugin, session_factory, drive)
+                        drive_agents.extend(drive_db.agents)
                     except IntegrityError as err:
                         session.rollback()
                         LOG.error('IntegrityError while adding drive %s for vehicle %s to database, likely due to concurrent addition: %s', drive_id, vin,
                                   err)
-                        database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        database_plugin.report_database_error()
                     except DatabaseError as err:
                         session.rollback()
                         LOG.error('DatabaseError while adding drive %s for vehicle %s to database: %s', drive_id, vin, err)
-                        database_plugin.healthy._set_value(value=False)  # pylint: disable=protected-access
+                        database_plugin.report_database_error()
                 else:
                     drive_db.connect(database_plugin, session_factory, drive)
+                    drive_agents.extend(drive_db.agents)
                     LOG.debug('Connecting drive %s for vehicle %s', drive_id, vin)
             state_agent: StateAgent = StateAgent(database_plugin, session_factory, self, carconnectivity_vehicle)
             self.agents.append(state_agent)
@@ -147,4 +150,6 @@ class Vehicle(Base):
                 charging_agent: ChargingAgent = ChargingAgent(database_plugin, session_factory, self, carconnectivity_vehicle)
                 self.agents.append(charging_agent)
                 LOG.debug("Adding ChargingAgent to vehicle %s", vin)
+            # The drives own their agents, the plugin flushes and closes them together with the agents of the vehicle
+            self.agents.extend(drive_agents)
         session_factory.remove()
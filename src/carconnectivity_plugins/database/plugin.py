@@ -3,12 +3,13 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import threading
+from contextlib import nullcontext
 
 import locale
 
 import logging
 
-from sqlalchemy import Engine, create_engine, text, inspect
+from sqlalchemy import Engine, create_engine, event, text, inspect
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.exc import DatabaseError, OperationalError, IntegrityError
 from sqlalchemy.orm.session import Session
@@ -29,12 +30,25 @@ from carconnectivity_plugins.database.model.base import Base
 
 
 if TYPE_CHECKING:
-    from typing import Dict, Optional
+    from typing import ContextManager, Dict, Optional
     from carconnectivity.carconnectivity import CarConnectivity
 
 LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.database")
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Configure new SQLite connections for many small commits: with the write ahead log readers do not block the writer and
+    with synchronous NORMAL a commit no longer waits for an fsync, only checkpoints do.
+    """
+    del connection_record
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
 class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
     """
     Plugin class for Database connectivity.
@@ -48,6 +62,9 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
 
         self._background_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self._health_stop_event = threading.Event()
+        self._database_error_event = threading.Event()
 
         LOG.info("Loading database plugin with config %s", config_remove_credentials(config))
 
@@ -77,11 +94,19 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
         self.locale: str = self.active_config['locale'] or ''
 
         connect_args = {}
+        engine_args = {}
         if 'postgresql' in self.active_config['db_url']:
             connect_args['options'] = '-c timezone=utc'
-        self.engine: Engine = create_engine(self.active_config['db_url'], pool_pre_ping=True, connect_args=connect_args)
+        if not self.active_config['db_url'].startswith('sqlite'):
+            # Reuse the most recently returned connection, so idle connections beyond the current load can time out on the server
+            engine_args['pool_use_lifo'] = True
+        self.engine: Engine = create_engine(self.active_config['db_url'], pool_pre_ping=True, connect_args=connect_args, **engine_args)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', _set_sqlite_pragmas)
         session_factory: sessionmaker[Session] = sessionmaker(bind=self.engine, autoflush=True, expire_on_commit=False)
         self.scoped_session_factory: scoped_session[Session] = scoped_session(session_factory)
+        # SQLite allows only one writer at a time, agents writing from their own threads take turns instead of waiting for the busy timeout
+        self.write_lock: ContextManager = threading.RLock() if self.engine.dialect.name == 'sqlite' else nullcontext()
 
         self.vehicles: Dict[str, Vehicle] = {}
         self.vehicles_lock: TimeoutLock = TimeoutLock()
@@ -91,6 +116,10 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
         self._background_thread = threading.Thread(target=self._background_loop, daemon=False)
         self._background_thread.name = 'carconnectivity.plugins.database-background'
         self._background_thread.start()
+        self._health_stop_event.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=False)
+        self._health_thread.name = 'carconnectivity.plugins.database-health'
+        self._health_thread.start()
         self.healthy._set_value(value=True)  # pylint: disable=protected-access
         LOG.debug("Starting Database plugin done")
         return super().startup()
@@ -106,15 +135,7 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
                     if first_run:
                         LOG.info('Database connection established successfully')
                         first_run = False
-                        if not inspect(self.engine).has_table("alembic_version"):
-                            LOG.info('It looks like you have an empty database will create all tables')
-                            Base.metadata.create_all(self.engine)
-                            run_database_migrations(dsn=self.active_config['db_url'], stamp_only=True)
-                        else:
-                            LOG.info('It looks like you have an existing database will check if an upgrade is necessary')
-                            Base.metadata.create_all(self.engine)  # TODO: remove after some time
-                            run_database_migrations(dsn=self.active_config['db_url'])
-                            LOG.info('Database upgrade done')
+                        self._prepare_schema()
                         session.commit()
                         self.car_connectivity.garage.add_observer(self.__on_add_vehicle, flag=Observable.ObserverEvent.ENABLED, on_transaction_end=True)
                         with self.vehicles_lock:
@@ -133,27 +154,83 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
                                         except IntegrityError as err:
                                             session.rollback()
                                             LOG.error('IntegrityError while adding vehicle %s to database: %s', garage_vehicle.vin.value, err)
-                                            self.healthy._set_value(value=False)  # pylint: disable=protected-access
+                                            self.report_database_error()
                                         except DatabaseError as err:
                                             session.rollback()
                                             LOG.error('DatabaseError while adding vehicle %s to database: %s', garage_vehicle.vin.value, err)
-                                            self.healthy._set_value(value=False)  # pylint: disable=protected-access
+                                            self.report_database_error()
                                     else:
                                         new_vehicle.connect(self, self.scoped_session_factory, garage_vehicle)
                                         self.vehicles[garage_vehicle.vin.value] = new_vehicle
+                    self._flush_agents()
                 except OperationalError as err:
                     LOG.error('Could not establish a connection to database, will try again after 10 seconds: %s', err)
                     self.healthy._set_value(value=False)  # pylint: disable=protected-access
                 self._stop_event.wait(10)
         self.scoped_session_factory.remove()
 
+    def _prepare_schema(self) -> None:
+        """
+        Create the tables of an empty database, or upgrade an existing database to the current schema.
+        """
+        if not inspect(self.engine).has_table("alembic_version"):
+            LOG.info('It looks like you have an empty database will create all tables')
+            Base.metadata.create_all(self.engine)
+            run_database_migrations(dsn=self.active_config['db_url'], stamp_only=True)
+        else:
+            LOG.info('It looks like you have an existing database will check if an upgrade is necessary')
+            Base.metadata.create_all(self.engine)  # TODO: remove after some time
+            run_database_migrations(dsn=self.active_config['db_url'])
+            LOG.info('Database upgrade done')
+
+    def _health_loop(self) -> None:
+        while True:
+            self._database_error_event.wait()
+            self._database_error_event.clear()
+            if self._health_stop_event.is_set():
+                break
+            # Errors during an outage are reported only once, until the connection check marks the database healthy again
+            if self.healthy.value is not False:
+                self.healthy._set_value(value=False)  # pylint: disable=protected-access
+
+    def report_database_error(self) -> None:
+        """
+        Mark the plugin as unhealthy after a database error.
+        The healthy attribute is set by the health thread, so its observers are not notified while the caller holds its locks.
+        Errors reported before the health thread handled the previous one are only reported once.
+        """
+        self._database_error_event.set()
+
     def shutdown(self) -> None:
         self.car_connectivity.garage.remove_observer(self.__on_add_vehicle)
         self._stop_event.set()
         if self._background_thread is not None:
             self._background_thread.join()
+        self._flush_agents(close=True)
+        if self._health_thread is not None:
+            self._health_stop_event.set()
+            pending_error: bool = self._database_error_event.is_set()
+            self._database_error_event.set()
+            self._health_thread.join()
+            if pending_error:
+                self.healthy._set_value(value=False)  # pylint: disable=protected-access
         return super().shutdown()
 
+    def _flush_agents(self, close: bool = False) -> None:
+        """
+        Write all changes the agents of all vehicles have held back to the database, the agents of a vehicle include those of its drives.
+
+        Args:
+            close (bool): Also stop the agents, e.g. on shutdown. Agents handling events in a worker thread finish the queued events first.
+        """
+        with self.vehicles_lock:
+            vehicles: list[Vehicle] = list(self.vehicles.values())
+        for vehicle in vehicles:
+            for agent in vehicle.agents:
+                if close:
+                    agent.close()
+                agent.flush()
+
     def get_version(self) -> str:
         return __version__
 
@@ -179,11 +256,11 @@ class Plugin(BasePlugin):  # pylint: disable=too-many-instance-attributes
                         except IntegrityError as err:
                             session.rollback()
                             LOG.error('IntegrityError while adding vehicle %s to database: %s', element.vin.value, err)
-                            self.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.report_database_error()
                         except DatabaseError as err:
                             session.rollback()
                             LOG.error('DatabaseError while adding vehicle %s to database: %s', element.vin.value, err)
-                            self.healthy._set_value(value=False)  # pylint: disable=protected-access
+                            self.report_database_error()
                     else:
                         vehicle.connect(self, self.scoped_session_factory, element)
                     self.vehicles[element.vin.value] = vehicle